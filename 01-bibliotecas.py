@@ -1,5 +1,14 @@
 # Importa bibliotecas
 import pandas as pd
 import numpy as np
-import os, time
-from datetime import datetime, timedelta
\ No newline at end of file
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import requests
+import os, sys, time, random, threading, gzip, hashlib, json, pickle, sqlite3, shutil
+from datetime import datetime, timedelta
+from io import BytesIO
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode, quote
@@ -1,19 +1,451 @@
 
-# Retenta ler um CSV se falhar download
-def ler_csv(*args, **kwargs):
-  max_tentativas = 5
-  intervalo = 2
-  tentativas = 0
-  while tentativas < max_tentativas:
+# Nº máximo de coletas simultâneas e de requisições simultâneas por servidor
+max_coletas_paralelas = 16
+max_requisicoes_por_host = 4
+
+# Nº máximo de janelas de datas coletadas simultaneamente por série diária
+max_janelas_paralelas = 6
+
+# Semáforos por servidor, criados sob demanda
+semaforos_host = {}
+trava_semaforos_host = threading.Lock()
+
+# Limita as requisições simultâneas a um mesmo servidor (ex.: api.bcb.gov.br)
+@contextmanager
+def limite_host(url):
+  host = urlparse(str(url)).netloc
+  with trava_semaforos_host:
+    if host not in semaforos_host:
+      semaforos_host[host] = threading.BoundedSemaphore(max_requisicoes_por_host)
+    semaforo = semaforos_host[host]
+  with semaforo:
+    yield
+
+# Tempo limite (em segundos) para conectar e para receber a resposta HTTP
+timeout_conexao = 10
+timeout_leitura = 120
+
+# Servidor local que substitui as APIs (ver servidor_local.py), se definido;
+# nesse caso o cache e a cópia dos metadados ficam em uma pasta própria, para
+# que respostas gravadas ou sintéticas não sejam usadas em execuções reais
+servidor_local = os.environ.get("SERVIDOR_LOCAL")
+pasta_servidor_local = os.environ.get("PASTA_SERVIDOR_LOCAL", "execucao_local")
+
+# URL efetivamente requisitada: a original ou a equivalente no servidor local
+def url_destino(url):
+  if not servidor_local:
+    return url
+  partes = urlparse(url)
+  consulta = f"?{partes.query}" if partes.query else ""
+  return f"{servidor_local.rstrip('/')}/{partes.scheme}/{partes.netloc}{partes.path}{consulta}"
+
+# Sessões HTTP persistentes (keep-alive), uma por servidor
+sessoes_http = {}
+trava_sessoes_http = threading.Lock()
+
+# Retorna a sessão HTTP do servidor, criando-a na primeira requisição
+def sessao_http(host):
+  with trava_sessoes_http:
+    if host not in sessoes_http:
+      sessao = requests.Session()
+      adaptador = requests.adapters.HTTPAdapter(
+          pool_connections = 1,
+          pool_maxsize = max_requisicoes_por_host
+          )
+      sessao.mount("http://", adaptador)
+      sessao.mount("https://", adaptador)
+      sessao.headers.update({"Accept-Encoding": "gzip, deflate"})
+      sessoes_http[host] = sessao
+    return sessoes_http[host]
+
+# Política de retentativas das requisições HTTP: espera exponencial com
+# variação aleatória (jitter), só para erros temporários, disjuntor por
+# servidor após falhas consecutivas e prazo total para a execução
+class PoliticaRetentativa:
+
+  def __init__(self, max_tentativas = 5, espera_inicial = 1, espera_maxima = 60,
+               prazo_total = 1800, limite_falhas_host = 5, pausa_disjuntor = 120):
+    self.max_tentativas = max_tentativas
+    self.espera_inicial = espera_inicial
+    self.espera_maxima = espera_maxima
+    self.prazo_total = prazo_total
+    self.limite_falhas_host = limite_falhas_host
+    self.pausa_disjuntor = pausa_disjuntor
+    self.inicio = time.monotonic()
+    self.trava = threading.Lock()
+    self.falhas_consecutivas = {}
+    self.disjuntor_aberto_ate = {}
+    self.contagem = {
+        "requisicoes": 0,
+        "retentativas": 0,
+        "falhas": 0,
+        "bloqueios_disjuntor": 0,
+        "segundos_em_espera": 0.0
+    }
+    self.retentativas_host = {}
+
+  # Erros de conexão, tempo limite e HTTP 408/429/5xx são temporários;
+  # os demais (ex.: 404, erro de leitura do conteúdo) são definitivos
+  def erro_temporario(self, erro):
+    if isinstance(erro, (requests.ConnectionError, requests.Timeout)):
+      return True
+    if isinstance(erro, requests.HTTPError) and erro.response is not None:
+      return erro.response.status_code in (408, 425, 429) or erro.response.status_code >= 500
+    return False
+
+  def tempo_decorrido(self):
+    return time.monotonic() - self.inicio
+
+  def verificar_disjuntor(self, host):
+    with self.trava:
+      if time.monotonic() < self.disjuntor_aberto_ate.get(host, 0):
+        self.contagem["bloqueios_disjuntor"] += 1
+        raise Exception(f"Disjuntor aberto para {host} após falhas consecutivas")
+
+  def registrar_sucesso(self, host):
+    with self.trava:
+      self.falhas_consecutivas[host] = 0
+
+  # Abre o disjuntor do servidor ao atingir o limite de falhas consecutivas;
+  # depois da pausa, uma nova falha volta a abri-lo
+  def registrar_falha(self, host, temporario):
+    with self.trava:
+      self.contagem["falhas"] += 1
+      if not temporario:
+        return
+      self.falhas_consecutivas[host] = self.falhas_consecutivas.get(host, 0) + 1
+      if self.falhas_consecutivas[host] >= self.limite_falhas_host:
+        self.disjuntor_aberto_ate[host] = time.monotonic() + self.pausa_disjuntor
+        self.falhas_consecutivas[host] = self.limite_falhas_host - 1
+
+  # Executa a requisição (função sem argumentos) aplicando a política
+  def executar(self, funcao, url):
+    host = urlparse(url).netloc
+    for tentativa in range(1, self.max_tentativas + 1):
+      if self.tempo_decorrido() > self.prazo_total:
+        raise Exception(f"Prazo total de {self.prazo_total}s esgotado antes de requisitar {url}")
+      self.verificar_disjuntor(host)
+      with self.trava:
+        self.contagem["requisicoes"] += 1
       try:
-          df = pd.read_csv(*args, **kwargs)
-          return df
-      except Exception as e:
-          tentativas += 1
-          print(f"Tentativa {tentativas} falhou: {e}")
-          time.sleep(intervalo)
-  print(f"Falha após {max_tentativas} tentativas.")
-  return None
+        resultado = funcao()
+      except Exception as erro:
+        temporario = self.erro_temporario(erro)
+        self.registrar_falha(host, temporario)
+        espera = random.uniform(0, min(self.espera_maxima, self.espera_inicial * 2 ** (tentativa - 1)))
+        if (not temporario or tentativa == self.max_tentativas or
+            self.tempo_decorrido() + espera > self.prazo_total):
+          raise
+        print(f"Tentativa {tentativa} falhou ({erro}); nova tentativa em {espera:.1f}s")
+        with self.trava:
+          self.contagem["retentativas"] += 1
+          self.contagem["segundos_em_espera"] += espera
+          self.retentativas_host[host] = self.retentativas_host.get(host, 0) + 1
+        time.sleep(espera)
+      else:
+        self.registrar_sucesso(host)
+        return resultado
+
+  # Métricas da execução: contagens, tempo em espera e retentativas por servidor
+  def metricas(self):
+    with self.trava:
+      return {
+          **self.contagem,
+          "segundos_em_espera": round(self.contagem["segundos_em_espera"], 1),
+          "retentativas_por_host": dict(self.retentativas_host)
+      }
+
+# Política compartilhada por todas as coletas da execução
+politica_retentativa = PoliticaRetentativa(
+    prazo_total = float(os.environ.get("PRAZO_TOTAL_COLETA", 1800))
+    )
+
+# Exibe as métricas de retentativas e as adiciona ao resumo do GitHub Actions
+def relatar_metricas_coleta():
+  metricas = politica_retentativa.metricas()
+  print(f"Métricas da coleta: {json.dumps(metricas, ensure_ascii = False)}")
+  if os.environ.get("GITHUB_STEP_SUMMARY"):
+    with open(os.environ["GITHUB_STEP_SUMMARY"], "a", encoding = "utf-8") as arquivo:
+      arquivo.write("### Métricas da coleta\n\n| Métrica | Valor |\n| --- | --- |\n")
+      for chave, valor in metricas.items():
+        arquivo.write(f"| {chave} | {valor} |\n")
+
+# Cache local das respostas brutas: o conteúdo fica comprimido e endereçado
+# pelo seu hash, e o índice por URL (fonte + código + período) guarda os
+# validadores HTTP (ETag/Last-Modified) para requisições condicionais
+pasta_cache = os.environ.get("PASTA_CACHE", f"{pasta_servidor_local}/cache" if servidor_local else "cache")
+tamanho_max_cache = 1024 ** 3 # 1 GB, com descarte dos menos usados (LRU)
+usar_cache = os.environ.get("USAR_CACHE", "1") == "1"
+modo_offline = "--offline" in sys.argv or os.environ.get("MODO_OFFLINE", "0") == "1"
+trava_cache = threading.Lock()
+
+# Grava um arquivo de forma atômica (arquivo temporário + renomeação)
+def gravar_atomico(caminho, conteudo):
+  os.makedirs(os.path.dirname(caminho) or ".", exist_ok = True)
+  temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+  with open(temporario, "wb") as arquivo:
+    arquivo.write(conteudo)
+  os.replace(temporario, caminho)
+
+# Grava um data frame em parquet de forma atômica
+def gravar_parquet(df, caminho, **kwargs):
+  buffer = BytesIO()
+  df.to_parquet(buffer, **kwargs)
+  gravar_atomico(caminho, buffer.getvalue())
+
+# Caminho do conteúdo comprimido no cache, a partir do hash do conteúdo
+def caminho_objeto_cache(hash_conteudo):
+  return f"{pasta_cache}/objetos/{hash_conteudo}.gz"
+
+# Caminho da entrada do índice do cache de uma URL
+def caminho_indice_cache(url):
+  return f"{pasta_cache}/indice/{hashlib.sha256(url.encode()).hexdigest()}.json"
+
+# Lê a entrada do índice do cache de uma URL, se o conteúdo ainda existir, e
+# a marca como usada recentemente
+def ler_indice_cache(url):
+  caminho = caminho_indice_cache(url)
+  try:
+    with open(caminho, encoding = "utf-8") as arquivo:
+      entrada = json.load(arquivo)
+    os.utime(caminho)
+  except FileNotFoundError:
+    return None
+  if not os.path.exists(caminho_objeto_cache(entrada["conteudo"])):
+    return None
+  return entrada
+
+# Lê um conteúdo do cache e o marca como usado recentemente; None se ele foi
+# descartado (limpar_cache pode rodar em outra thread a qualquer momento)
+def ler_objeto_cache(hash_conteudo):
+  caminho = caminho_objeto_cache(hash_conteudo)
+  try:
+    os.utime(caminho)
+    with open(caminho, "rb") as arquivo:
+      return gzip.decompress(arquivo.read())
+  except FileNotFoundError:
+    return None
+
+# Guarda a resposta no cache e retorna o hash do conteúdo
+def gravar_cache(url, resposta):
+  hash_conteudo = hashlib.sha256(resposta.content).hexdigest()
+  caminho = caminho_objeto_cache(hash_conteudo)
+  try:
+    os.utime(caminho)
+    tamanho = 0
+  except FileNotFoundError:
+    comprimido = gzip.compress(resposta.content)
+    gravar_atomico(caminho, comprimido)
+    tamanho = len(comprimido)
+  entrada = {
+      "url": url,
+      "conteudo": hash_conteudo,
+      "etag": resposta.headers.get("ETag"),
+      "last_modified": resposta.headers.get("Last-Modified")
+  }
+  gravar_atomico(caminho_indice_cache(url), json.dumps(entrada).encode("utf-8"))
+  limpar_cache(tamanho)
+  return hash_conteudo
+
+# Tamanho do cache desde a última varredura mais o que foi gravado depois
+# (None antes da primeira varredura da execução) e validade das entradas do
+# índice sem uso (as URLs mudam com as datas de coleta)
+tamanho_cache_estimado = None
+validade_indice_cache = pd.Timedelta(days = 30)
+
+# Lista os arquivos de uma pasta do cache como (uso, tamanho, caminho),
+# ignorando os que sumirem durante a listagem
+def listar_arquivos_cache(pasta):
+  arquivos = []
+  if os.path.exists(pasta):
+    for e in os.scandir(pasta):
+      if e.name.endswith(".tmp"):
+        continue
+      try:
+        arquivos.append((e.stat().st_mtime, e.stat().st_size, e.path))
+      except FileNotFoundError:
+        pass
+  return arquivos
+
+# Remove um arquivo do cache, se ainda existir
+def remover_arquivo_cache(caminho):
+  try:
+    os.remove(caminho)
+  except FileNotFoundError:
+    pass
+
+# Descarta os arquivos do cache usados há mais tempo até caber no limite e as
+# entradas do índice cujo conteúdo foi descartado ou sem uso há mais que a
+# validade; a varredura só é feita na primeira gravação da execução e quando o
+# tamanho estimado passa do limite
+def limpar_cache(tamanho_gravado = 0):
+  global tamanho_cache_estimado
+  with trava_cache:
+    if tamanho_cache_estimado is not None and tamanho_cache_estimado + tamanho_gravado <= tamanho_max_cache:
+      tamanho_cache_estimado += tamanho_gravado
+      return
+
+    arquivos = sorted(sum([
+        listar_arquivos_cache(f"{pasta_cache}/{subpasta}")
+        for subpasta in ["objetos", "parseado", "modelos"]
+        ], []))
+    tamanho = sum(a[1] for a in arquivos)
+    for _, tamanho_arquivo, caminho in arquivos:
+      if tamanho <= tamanho_max_cache:
+        break
+      remover_arquivo_cache(caminho)
+      tamanho -= tamanho_arquivo
+    tamanho_cache_estimado = tamanho
+
+    limite_uso = (pd.Timestamp.now() - validade_indice_cache).timestamp()
+    for uso, _, caminho in listar_arquivos_cache(f"{pasta_cache}/indice"):
+      try:
+        with open(caminho, encoding = "utf-8") as arquivo:
+          conteudo = json.load(arquivo)["conteudo"]
+      except (FileNotFoundError, ValueError, KeyError):
+        continue
+      if uso < limite_uso or not os.path.exists(caminho_objeto_cache(conteudo)):
+        remover_arquivo_cache(caminho)
+
+# Baixa uma URL usando o cache: envia os validadores armazenados e, se o
+# servidor responder 304, reaproveita o conteúdo local; retorna o hash do
+# conteúdo e o conteúdo (None se carregar = False e ele veio do cache); com
+# condicional = False ignora o cache e baixa de novo (ex.: conteúdo descartado
+# depois do 304)
+def baixar_com_cache(url, timeout = None, carregar = True, condicional = True):
+  entrada = ler_indice_cache(url) if usar_cache and condicional else None
+
+  if modo_offline:
+    conteudo = ler_objeto_cache(entrada["conteudo"]) if entrada is not None and carregar else None
+    if entrada is None or (carregar and conteudo is None):
+      raise Exception(f"Resposta não encontrada no cache (modo offline): {url}")
+    return entrada["conteudo"], conteudo
+
+  cabecalhos = {}
+  if entrada is not None and entrada["etag"]:
+    cabecalhos["If-None-Match"] = entrada["etag"]
+  if entrada is not None and entrada["last_modified"]:
+    cabecalhos["If-Modified-Since"] = entrada["last_modified"]
+
+  if timeout is None:
+    timeout = (timeout_conexao, timeout_leitura)
+
+  def requisitar():
+    with limite_host(url):
+      resposta = sessao_http(urlparse(url).netloc).get(url_destino(url), timeout = timeout, headers = cabecalhos)
+    if not (resposta.status_code == 304 and entrada is not None):
+      resposta.raise_for_status()
+    return resposta
+
+  resposta = politica_retentativa.executar(requisitar, url)
+
+  if resposta.status_code == 304:
+    if not carregar:
+      return entrada["conteudo"], None
+    conteudo = ler_objeto_cache(entrada["conteudo"])
+    if conteudo is None:
+      return baixar_com_cache(url, timeout, carregar, condicional = False)
+    return entrada["conteudo"], conteudo
+
+  if usar_cache:
+    return gravar_cache(url, resposta), resposta.content
+  return hashlib.sha256(resposta.content).hexdigest(), resposta.content
+
+# Baixa o conteúdo de uma URL pela sessão persistente do servidor; a resposta
+# já vem descomprimida e é retornada em bytes para o pandas ler
+def baixar(url, timeout = None):
+  return baixar_com_cache(url, timeout)[1]
+
+# Baixa e lê uma resposta com o leitor do pandas (pd.read_csv, pd.read_json,
+# pd.read_excel...); o resultado fica guardado pelo hash do conteúdo, de modo
+# que uma resposta inalterada (ex.: 304) não é lida novamente
+def ler_resposta(url, leitor, **kwargs):
+
+  # Argumentos com funções (ex.: converters) não têm representação estável
+  argumentos = repr(sorted(kwargs.items()))
+  memorizar = usar_cache and " at 0x" not in argumentos
+
+  hash_conteudo, conteudo = baixar_com_cache(url, carregar = not memorizar)
+
+  if memorizar:
+    chave = hashlib.sha256(f"{hash_conteudo}|{leitor.__name__}|{argumentos}".encode()).hexdigest()
+    caminho = f"{pasta_cache}/parseado/{chave}.pkl"
+    try:
+      os.utime(caminho)
+      return pd.read_pickle(caminho)
+    except FileNotFoundError:
+      pass
+    if conteudo is None:
+      conteudo = ler_objeto_cache(hash_conteudo)
+    if conteudo is None:
+      hash_conteudo, conteudo = baixar_com_cache(url, condicional = False)
+      chave = hashlib.sha256(f"{hash_conteudo}|{leitor.__name__}|{argumentos}".encode()).hexdigest()
+      caminho = f"{pasta_cache}/parseado/{chave}.pkl"
+
+  df = leitor(BytesIO(conteudo), **kwargs)
+
+  if memorizar:
+    serializado = pickle.dumps(df)
+    gravar_atomico(caminho, serializado)
+    limpar_cache(len(serializado))
+  return df
+
+# Executa as tarefas de coleta em paralelo e retorna os resultados na mesma
+# ordem das tarefas; cada tarefa é um dicionário com "funcao" e "argumentos"
+def coletar_em_paralelo(tarefas, max_workers = max_coletas_paralelas):
+  executor = ThreadPoolExecutor(max_workers = max_workers)
+  try:
+    futuros = [executor.submit(t["funcao"], **t["argumentos"]) for t in tarefas]
+    resultados = [f.result() for f in futuros]
+  except:
+    executor.shutdown(wait = True, cancel_futures = True)
+    raise
+  executor.shutdown(wait = True)
+  return resultados
+
+# Lê um CSV com o leitor do pyarrow, com tipos explícitos por coluna (ex.:
+# pa.float64(), pa.timestamp("ns")) e datas convertidas de forma vetorizada
+# pelos formatos informados ("ISO8601" ou formatos strptime), sem funções
+# Python por célula
+def ler_csv_arrow(buffer, sep = ",", decimal = ".", tipos = None, formatos_data = ["ISO8601"], valores_nulos = None):
+  opcoes_conversao = pa_csv.ConvertOptions(
+      column_types = tipos or {},
+      decimal_point = decimal,
+      timestamp_parsers = [pa_csv.ISO8601 if f == "ISO8601" else f for f in formatos_data]
+      )
+  if valores_nulos is not None:
+    opcoes_conversao.null_values = valores_nulos
+  tabela = pa_csv.read_csv(
+      buffer,
+      parse_options = pa_csv.ParseOptions(delimiter = sep),
+      convert_options = opcoes_conversao
+      )
+  return tabela.to_pandas()
+
+# Lê um CSV de uma URL (as retentativas seguem a politica_retentativa)
+def ler_csv(filepath_or_buffer, **kwargs):
+  return ler_resposta(filepath_or_buffer, pd.read_csv, **kwargs)
+
+# Lê uma janela de datas de uma série do SGS; uma janela sem dados (404 ou
+# CSV vazio, ex.: antes do início de uma série diária) resulta em um data
+# frame vazio em vez de falhar a série
+def ler_janela_sgs(url):
+  try:
+    return ler_resposta(
+        url,
+        ler_csv_arrow,
+        sep = ";",
+        decimal = ",",
+        tipos = {"data": pa.timestamp("ns"), "valor": pa.float64()},
+        formatos_data = ["%d/%m/%Y"]
+        )
+  except (requests.HTTPError, pa.ArrowInvalid) as erro:
+    if isinstance(erro, requests.HTTPError) and (erro.response is None or erro.response.status_code != 404):
+      raise
+    return pd.DataFrame({
+        "data": pd.Series(dtype = "datetime64[ns]"),
+        "valor": pd.Series(dtype = "float64")
+        })
 
 # Coleta dados da API do Banco Central (SGS)
 def coleta_bcb_sgs(codigo, nome, freq, data_inicio = "01/01/2000", data_fim = (pd.to_datetime("today") + pd.offsets.DateOffset(months = 36)).strftime("%d/%m/%Y")):
@@ -23,47 +455,316 @@ def coleta_bcb_sgs(codigo, nome, freq, data_inicio = "01/01/2000", data_fim = (p
   else:
     datas_inicio = [(data_inicio, data_fim)]
 
+  urls = [
+      f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=csv&dataInicial={d[0]}&dataFinal={d[1]}"
+      for d in datas_inicio
+      ]
+
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = []
-    for d in datas_inicio:
-      url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=csv&dataInicial={d[0]}&dataFinal={d[1]}"
-      resposta.append(ler_csv(filepath_or_buffer = url, sep = ";", decimal = ","))
-    resposta = pd.concat(resposta)
+    # Janelas coletadas em paralelo; o map preserva a ordem cronológica
+    with ThreadPoolExecutor(max_workers = min(max_janelas_paralelas, len(urls))) as executor:
+      resposta = list(executor.map(ler_janela_sgs, urls))
+    if all(df.empty for df in resposta):
+      raise Exception(f"Nenhuma janela com dados: {codigo}")
+    resposta = pd.concat([df for df in resposta if not df.empty])
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
+    # Remove o dia de fronteira, presente no fim de uma janela e no início da seguinte
     return (
         resposta
         .rename(columns = {"valor": nome})
-        .assign(data = lambda x: pd.to_datetime(x.data, format = "%d/%m/%Y"))
+        .drop_duplicates(subset = "data", keep = "last")
         .set_index("data")
     )
 
-# Coleta dados da API do Banco Central (ODATA)
-def coleta_bcb_odata(codigo, nome):
+# Arquivos da base de dados por frequência
+arquivos_frequencia = {
+    "Diária": "df_diaria.parquet",
+    "Mensal": "df_mensal.parquet",
+    "Trimestral": "df_trimestral.parquet",
+    "Anual": "df_anual.parquet"
+}
+
+# Janela de sobreposição da coleta incremental, para capturar revisões recentes
+janela_revisao_sgs = {
+    "Diária": pd.DateOffset(days = 30),
+    "Mensal": pd.DateOffset(months = 12),
+    "Trimestral": pd.DateOffset(months = 24),
+    "Anual": pd.DateOffset(years = 2)
+}
+
+# Lê uma série já armazenada na base de dados, se existir
+def ler_serie_armazenada(nome, freq, pasta = "dados"):
+  arquivo = f"{pasta}/{arquivos_frequencia[freq]}"
+  if not os.path.exists(arquivo) or nome not in pq.read_schema(arquivo).names:
+    return None
+  serie = ler_series([nome], freq, pasta = pasta)[nome].dropna()
+  serie = serie[~serie.index.duplicated(keep = "last")]
+  if serie.empty:
+    return None
+  return serie
 
-  url = codigo
+# Frequência do arquivo da base de dados em que a série está armazenada
+def frequencia_armazenada(nome, frequencias, pasta = "dados"):
+  for freq in frequencias:
+    if ler_serie_armazenada(nome, freq, pasta) is not None:
+      return freq
+  return None
+
+# Coleta dados da API do Banco Central (SGS) somente a partir da última data
+# armazenada (menos a janela de revisão) e junta com o histórico
+def coleta_bcb_sgs_incremental(codigo, nome, freq, pasta = "dados", janela_revisao = None):
+
+  historico = ler_serie_armazenada(nome, freq, pasta)
+  if historico is None:
+    return coleta_bcb_sgs(codigo, nome, freq)
+
+  if janela_revisao is None:
+    janela_revisao = janela_revisao_sgs[freq]
+  inicio = max(historico.index.max() - janela_revisao, pd.to_datetime("2000-01-01"))
+
+  delta = coleta_bcb_sgs(codigo, nome, freq, data_inicio = inicio.strftime("%d/%m/%Y"))
+  if delta.empty:
+    return historico.to_frame()
+
+  return pd.concat([
+      historico[historico.index < delta.index.min()].to_frame(),
+      delta
+      ])
+
+# Tamanho da página das consultas ODATA (parâmetros $top/$skip)
+tamanho_pagina_odata = 20000
+
+# Colunas usadas no tratamento das expectativas, por recurso ODATA
+colunas_odata_padrao = ["Data", "DataReferencia", "Mediana"]
+colunas_odata = {"ExpectativasMercadoInflacao12Meses": ["Data", "Mediana"]}
+
+# Chave única das linhas de cada recurso ODATA, usada para ordenar a paginação
+# (com empates em Data o servidor pode ordenar as páginas de formas
+# diferentes) e remover linhas repetidas entre páginas
+chaves_odata_padrao = ["Indicador", "Data", "DataReferencia", "baseCalculo"]
+chaves_odata = {
+    "ExpectativasMercadoAnuais": ["Indicador", "IndicadorDetalhe", "Data", "DataReferencia", "baseCalculo"],
+    "ExpectativasMercadoInflacao12Meses": ["Indicador", "Data", "Suavizada", "baseCalculo"],
+    "ExpectativasMercadoTop5Mensais": ["Indicador", "Data", "DataReferencia", "tipoCalculo"],
+    "ExpectativasMercadoTop5Anuais": ["Indicador", "Data", "DataReferencia", "tipoCalculo"]
+}
+
+# Nome do recurso ODATA de uma URL
+def recurso_odata(url):
+  return urlparse(url).path.rstrip("/").split("/")[-1]
+
+# Janela de sobreposição da coleta incremental do BCB/ODATA
+janela_revisao_odata = {
+    "Mensal": pd.DateOffset(months = 2),
+    "Trimestral": pd.DateOffset(months = 6)
+}
+
+# Monta a URL de uma página da consulta ODATA a partir da URL dos metadados:
+# mantém o filtro original (indicador etc.), acrescenta o filtro de data,
+# seleciona só as colunas usadas (e as da chave) e ordena pela chave única
+# para paginar
+def montar_url_odata(url, data_inicio = None, pagina = 0):
+
+  partes = urlparse(url)
+  parametros = dict(parse_qsl(partes.query, keep_blank_values = True))
+  recurso = recurso_odata(url)
+  colunas = colunas_odata.get(recurso, colunas_odata_padrao)
+  chave = chaves_odata.get(recurso, chaves_odata_padrao)
+
+  filtros = [parametros["$filter"]] if parametros.get("$filter") else []
+  if data_inicio is not None:
+    filtros.append(f"Data ge '{pd.to_datetime(data_inicio).strftime('%Y-%m-%d')}'")
+
+  parametros.pop("$filter", None)
+  if filtros:
+    parametros["$filter"] = " and ".join(filtros)
+  parametros.update({
+      "$select": ",".join(colunas + [c for c in chave if c not in colunas]),
+      "$orderby": ",".join(chave),
+      "$top": str(tamanho_pagina_odata),
+      "$skip": str(pagina * tamanho_pagina_odata),
+      "$format": "text/csv"
+  })
+
+  return urlunparse(partes._replace(query = urlencode(parametros, quote_via = quote, safe = "$,'/")))
+
+# Coleta dados da API do Banco Central (ODATA), com filtros e paginação no servidor
+def coleta_bcb_odata(codigo, nome, data_inicio = None):
 
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = ler_csv(
-        filepath_or_buffer = url,
-        sep = ",", decimal = ",",
-        converters = {"Data": lambda x: pd.to_datetime(x)}
-        )
+    # Cada página é lida assim que chega; a última vem incompleta
+    resposta = []
+    pagina = 0
+    while True:
+      df = ler_resposta(
+          montar_url_odata(codigo, data_inicio, pagina),
+          ler_csv_arrow,
+          decimal = ",",
+          tipos = {
+              "Data": pa.timestamp("ns"),
+              "DataReferencia": pa.string(),
+              "Mediana": pa.float64()
+              }
+          )
+      resposta.append(df)
+      if df.shape[0] < tamanho_pagina_odata:
+        break
+      pagina += 1
+    resposta = pd.concat(resposta, ignore_index = True)
+    chave = [c for c in chaves_odata.get(recurso_odata(codigo), chaves_odata_padrao) if c in resposta.columns]
+    resposta = (
+        resposta
+        .drop_duplicates(subset = chave)
+        .filter(colunas_odata.get(recurso_odata(codigo), colunas_odata_padrao))
+        .reset_index(drop = True)
+    )
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
     return resposta.rename(columns = {"Mediana": nome})
 
+# Coleta dados da API do Banco Central (ODATA) somente a partir do último
+# período armazenado (menos a janela de revisão); o tratamento completa o
+# restante com o histórico (ver completar_com_historico)
+def coleta_bcb_odata_incremental(codigo, nome, pasta = "dados"):
+
+  freq = frequencia_armazenada(nome, ["Mensal", "Trimestral"], pasta)
+  if freq is None:
+    return coleta_bcb_odata(codigo, nome)
+
+  historico = ler_serie_armazenada(nome, freq, pasta)
+  inicio = (
+      (historico.index.max() - janela_revisao_odata[freq])
+      .to_period("M" if freq == "Mensal" else "Q")
+      .to_timestamp()
+      )
+  return coleta_bcb_odata(codigo, nome, data_inicio = inicio)
+
+# Completa um data frame tratado com o histórico armazenado das mesmas séries,
+# preservando os valores novos (usado após coletas incrementais)
+def completar_com_historico(df, freq, pasta = "dados"):
+  historico = [ler_serie_armazenada(col, freq, pasta) for col in df.columns]
+  historico = [h for h in historico if h is not None]
+  if not historico:
+    return df
+  return df.combine_first(pd.concat(historico, axis = "columns"))
+
+# Formato da data de referência e unidade do horizonte (em dias) de cada
+# recurso ODATA das expectativas do Focus
+formatos_focus = {
+    "ExpectativasMercadoTop5Mensais": {"referencia": "mensal", "unidade": 30},
+    "ExpectativasMercadoTop5Anuais": {"referencia": "anual", "unidade": 365},
+    "ExpectativaMercadoMensais": {"referencia": "mensal", "unidade": 30},
+    "ExpectativasMercadoTrimestrais": {"referencia": "trimestral", "unidade": 30},
+    "ExpectativasMercadoAnuais": {"referencia": "anual", "unidade": 365},
+    "ExpectativasMercadoInflacao12Meses": {"referencia": None, "unidade": None}
+}
+
+# Horizonte alvo de cada expectativa, na unidade do recurso (a coluna
+# "Horizonte" dos metadados, se preenchida, tem precedência); séries sem
+# horizonte são agregadas por inteiro
+horizontes_focus = {
+    "expec_ipca_top5_curto_prazo": 1,
+    "expec_ipca_top5_medio_prazo": 6,
+    "expec_selic": 1,
+    "expec_cambio": 1,
+    "expec_pib": 9,
+    "expec_primario": 1
+}
+
+# Monta as regras de agregação de cada expectativa a partir dos metadados:
+# recurso ODATA (formato e unidade), horizonte alvo e frequência de saída; uma
+# série com horizonte em um recurso fora de formatos_focus é um erro (sem o
+# formato, o horizonte não é calculado e todas as linhas seriam descartadas)
+def regras_focus(metadados):
+  regras = pd.DataFrame({
+      "recurso": metadados["Input de Coleta"].map(recurso_odata).to_list(),
+      "frequencia": metadados["Frequência"].to_list()
+  }, index = metadados["Identificador"].to_list())
+  regras["referencia"] = regras.recurso.map(lambda r: formatos_focus.get(r, {}).get("referencia"))
+  regras["unidade"] = regras.recurso.map(lambda r: formatos_focus.get(r, {}).get("unidade")).astype(float)
+  regras["horizonte"] = pd.Series(horizontes_focus, dtype = float).reindex(regras.index)
+  if "Horizonte" in metadados.columns:
+    horizonte = pd.to_numeric(pd.Series(metadados["Horizonte"].to_list(), index = regras.index), errors = "coerce")
+    regras["horizonte"] = horizonte.fillna(regras.horizonte)
+  desconhecidas = regras.query("horizonte.notna() and ~recurso.isin(@formatos_focus)")
+  if not desconhecidas.empty:
+    raise Exception(
+        f"Recurso ODATA sem formato em formatos_focus: "
+        f"{', '.join(f'{s} ({r})' for s, r in desconhecidas.recurso.items())}"
+        )
+  return regras
+
+# Agrega as expectativas do Focus de todas as séries em uma única passada:
+# empilha os data frames coletados, decodifica a data de referência, calcula o
+# horizonte, mantém o horizonte alvo e tira a média por série e período da
+# pesquisa (mês ou trimestre), devolvendo um data frame por frequência
+def agregar_expectativas_focus(lista, metadados):
+  regras = regras_focus(metadados)
+  if len(lista) == 0:
+    return {freq: pd.DataFrame(index = pd.DatetimeIndex([], name = "data")) for freq in regras.frequencia.unique()}
+
+  longo = pd.concat([
+      df
+      .rename(columns = {df.columns.difference(["Data", "DataReferencia"])[0]: "valor"})
+      .assign(serie = df.columns.difference(["Data", "DataReferencia"])[0])
+      for df in lista
+    ], ignore_index = True)
+  regra = regras.reindex(longo.serie)
+
+  # Data de referência ("MM/AAAA", "T/AAAA" ou "AAAA") como mês de início
+  referencia = longo.get("DataReferencia", pd.Series(index = longo.index, dtype = object)).fillna("")
+  ano = pd.to_numeric(referencia.str[-4:], errors = "coerce").to_numpy()
+  prefixo = pd.to_numeric(referencia.str[:-5], errors = "coerce").to_numpy()
+  formato = regra.referencia.to_numpy()
+  mes = np.select(
+      [formato == "mensal", formato == "trimestral", formato == "anual"],
+      [prefixo - 1, 3 * (prefixo - 1), 0],
+      default = np.nan
+      )
+  meses_referencia = (ano - 1970) * 12 + mes
+
+  # Horizonte truncado em unidades do recurso e período da pesquisa
+  data = longo.Data.to_numpy().astype("datetime64[D]")
+  meses_pesquisa = data.astype("datetime64[M]").astype(np.int64)
+  inicio_referencia = np.where(
+      np.isnan(meses_referencia), 0, meses_referencia
+      ).astype(np.int64).astype("datetime64[M]").astype("datetime64[D]")
+  dias = np.where(np.isnan(meses_referencia), np.nan, (inicio_referencia - data).astype(float))
+  horizonte = np.trunc(dias / regra.unidade.to_numpy())
+  alvo = regra.horizonte.to_numpy()
+  trimestral = regra.frequencia.to_numpy() == "Trimestral"
+  periodo = np.where(trimestral, meses_pesquisa - meses_pesquisa % 3, meses_pesquisa)
+
+  agregado = (
+      pd.DataFrame({
+          "serie": longo.serie.to_numpy(),
+          "data": periodo.astype("datetime64[M]").astype("datetime64[ns]"),
+          "valor": longo.valor.to_numpy()
+          })
+      .loc[np.isnan(alvo) | (horizonte == alvo)]
+      .groupby(["serie", "data"])["valor"]
+      .mean()
+      .unstack("serie")
+      .rename_axis(columns = None)
+  )
+
+  return {
+      freq: agregado.filter(regras.index[regras.frequencia == freq]).dropna(how = "all")
+      for freq in regras.frequencia.unique()
+  }
+
 # Coleta dados da API do IPEA (IPEADATA)
 def coleta_ipeadata(codigo, nome):
 
   url = f"http://www.ipeadata.gov.br/api/odata4/ValoresSerie(SERCODIGO='{codigo}')"
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = pd.read_json(url)
+    resposta = ler_resposta(url, pd.read_json)
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
@@ -79,7 +780,7 @@ def coleta_ibge_sidra(codigo, nome):
   url = f"{codigo}?formato=json"
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = pd.read_json(url)
+    resposta = ler_resposta(url, pd.read_json)
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
   else:
@@ -92,6 +793,26 @@ def coleta_ibge_sidra(codigo, nome):
     df[nome] = pd.to_numeric(df[nome])
     return df
 
+# Datas de início já decodificadas por código de período do SIDRA e frequência
+periodos_sidra = {}
+
+# Converte códigos de período do SIDRA (AAAAMM mensal ou AAAA0T trimestral) em
+# datas de início do período com aritmética inteira, decodificando cada código
+# distinto uma única vez
+def decodificar_periodo_sidra(codigos, freq):
+  codigos = pd.to_numeric(pd.Series(codigos)).to_numpy(dtype = np.int64)
+  unicos, posicoes = np.unique(codigos, return_inverse = True)
+
+  novos = np.array([c for c in unicos.tolist() if (c, freq) not in periodos_sidra], dtype = np.int64)
+  if len(novos) > 0:
+    ano, periodo = novos // 100, novos % 100
+    mes = periodo - 1 if freq == "Mensal" else 3 * (periodo - 1)
+    datas = ((ano - 1970) * 12 + mes).astype("datetime64[M]").astype("datetime64[ns]")
+    periodos_sidra.update(zip([(c, freq) for c in novos.tolist()], datas))
+
+  datas = np.array([periodos_sidra[(c, freq)] for c in unicos.tolist()], dtype = "datetime64[ns]")
+  return pd.DatetimeIndex(datas[posicoes], name = "data")
+
 # Coleta dados da API do FRED
 def coleta_fred(codigo, nome):
 
@@ -99,9 +820,15 @@ def coleta_fred(codigo, nome):
 
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = ler_csv(
-        filepath_or_buffer = url,
-        converters = {"DATE": lambda x: pd.to_datetime(x)}
+    resposta = ler_resposta(
+        url,
+        ler_csv_arrow,
+        tipos = {
+            "observation_date": pa.timestamp("ns"),
+            "DATE": pa.timestamp("ns"),
+            codigo: pa.float64()
+            },
+        valores_nulos = [".", ""]
         )
   except:
     raise Exception(f"Falha na coleta da série {codigo} ({nome})")
@@ -113,8 +840,9 @@ def coleta_ifi(codigo, nome):
 
   try:
     print(f"Coletando a série {codigo} ({nome})")
-    resposta = pd.read_excel(
-        io = codigo,
+    resposta = ler_resposta(
+        codigo,
+        pd.read_excel,
         sheet_name = "Hiato do Produto",
         names = ["data", "lim_inf", nome, "lim_sup"],
         skiprows = 2
@@ -149,3 +877,724 @@ def split_date_range(start_date_str, end_date_str, interval_years=5):
     current_start = current_end
 
   return result
+
+# Cruza séries de mesma frequência em uma única passada: alinha todas pela
+# união dos índices de datas (construída uma só vez) e concatena as colunas,
+# em vez de juntar os data frames par a par
+def cruzar_series(lista, nome_indice = "data"):
+  lista = [
+    df.loc[~df.index.duplicated(keep = "last")].rename_axis(nome_indice)
+    for df in lista
+    if df is not None
+  ]
+  if len(lista) == 0:
+    return pd.DataFrame(index = pd.DatetimeIndex([], name = nome_indice))
+  return pd.concat(lista, axis = "columns", join = "outer", sort = True)
+
+# Regra de agregação das séries diárias para frequências menores, quando não for
+# a média (a coluna "Agregação" dos metadados, se preenchida, tem precedência):
+# "media", "primeiro", "ultimo", "soma" ou "fim_periodo". "primeiro" e "ultimo"
+# usam a primeira (última) observação válida do período: na base cruzada, a
+# primeira linha do mês pode ser de outra série, com a coluna ausente
+regras_agregacao = {"selic": "primeiro"}
+
+# Regra de agregação de cada coluna, a partir dos metadados e das regras padrão
+def regras_agregacao_series(colunas, metadados = None):
+  regras = {c: regras_agregacao.get(c, "media") for c in colunas}
+  if metadados is not None and "Agregação" in metadados.columns:
+    for c in colunas:
+      regra = metadados["Agregação"].get(c)
+      if isinstance(regra, str) and regra.strip():
+        regras[c] = regra.strip()
+  return regras
+
+# Agrega um data frame para mensal ("MS") ou trimestral ("QS") em uma única
+# passada sobre chaves int64 de mês, aplicando a cada coluna sua regra (média
+# se não informada); valores ausentes são ignorados, exceto em "fim_periodo",
+# que toma a última linha do período
+def agregar_frequencia(df, freq = "MS", regras = None):
+  regras = regras or {}
+  passo = 3 if freq == "QS" else 1
+  indice = df.index.tz_localize(None) if getattr(df.index, "tz", None) is not None else df.index
+  if len(indice) == 0:
+    return pd.DataFrame(columns = df.columns, index = pd.DatetimeIndex([], name = "data"), dtype = float)
+
+  ordem = np.argsort(indice.to_numpy(), kind = "stable")
+  meses = indice.to_numpy()[ordem].astype("datetime64[M]").astype(np.int64)
+  meses = meses - meses % passo
+  valores = df.to_numpy(dtype = np.float64)[ordem]
+  validos = ~np.isnan(valores)
+
+  # Grupos (períodos) presentes e linha inicial de cada um
+  grupo = (meses - meses[0]) // passo
+  inicios = np.flatnonzero(np.r_[True, grupo[1:] != grupo[:-1]])
+  fins = np.r_[inicios[1:], len(grupo)] - 1
+  presentes = grupo[inicios]
+  somas = np.add.reduceat(np.where(validos, valores, 0), inicios, axis = 0)
+  contagens = np.add.reduceat(validos.astype(np.int64), inicios, axis = 0)
+
+  chaves = np.arange(meses[0], meses[-1] + 1, passo)
+  resultado = np.full((len(chaves), df.shape[1]), np.nan)
+  for j, coluna in enumerate(df.columns):
+    regra = regras.get(coluna, "media")
+    if regra in ("media", "soma"):
+      agregado = somas[:, j] / np.maximum(contagens[:, j], 1) if regra == "media" else somas[:, j]
+      resultado[presentes, j] = np.where(contagens[:, j] > 0, agregado, np.nan)
+    elif regra in ("primeiro", "ultimo"):
+      linhas = np.flatnonzero(validos[:, j])
+      linhas = linhas[::-1] if regra == "ultimo" else linhas
+      grupos, posicoes = np.unique(grupo[linhas], return_index = True)
+      resultado[grupos, j] = valores[linhas[posicoes], j]
+    elif regra == "fim_periodo":
+      resultado[presentes, j] = valores[fins, j]
+    else:
+      raise Exception(f"Regra de agregação desconhecida para a série {coluna}: {regra}")
+
+  return pd.DataFrame(
+      resultado,
+      index = pd.DatetimeIndex(chaves.astype("datetime64[M]").astype("datetime64[ns]"), name = "data"),
+      columns = df.columns
+  )
+
+# Tratamento incremental: só as séries cujos dados brutos ou metadados mudaram
+# desde a última execução são tratadas de novo; as demais colunas são mantidas
+# dos arquivos em dados/ (use TRATAMENTO_INCREMENTAL=0 para refazer tudo)
+tratamento_incremental = os.environ.get("TRATAMENTO_INCREMENTAL", "1") == "1"
+arquivo_impressoes = "dados/impressoes_tratamento.json"
+
+# Scripts cujo código define o tratamento; mudanças neles refazem todas as séries
+scripts_tratamento = ["02-funcoes.py", "04-tratamento.py", "05-disponibilizacao.py"]
+
+# Percorre as estruturas de dados brutos (dicionários por frequência, listas
+# ou data frames) devolvendo cada data frame com as séries que contém
+def percorrer_brutos(brutos, metadados):
+  if isinstance(brutos, dict):
+    for valor in brutos.values():
+      yield from percorrer_brutos(valor, metadados)
+  elif isinstance(brutos, list):
+    for valor in brutos:
+      yield from percorrer_brutos(valor, metadados)
+  elif brutos is not None:
+    yield brutos, [c for c in brutos.columns if c in metadados.index]
+
+# Calcula a impressão digital de cada série: hash dos valores brutos (com o
+# índice e as colunas) e da linha de metadados da série
+def impressoes_series(brutos, metadados):
+  impressoes = {}
+  for df, nomes in percorrer_brutos(brutos, metadados):
+    valores = pd.util.hash_pandas_object(df, index = True).to_numpy().tobytes()
+    for nome in nomes:
+      h = hashlib.sha256(valores)
+      h.update(json.dumps(list(map(str, df.columns))).encode("utf-8"))
+      h.update(json.dumps(metadados.loc[nome].to_dict(), sort_keys = True, default = str).encode("utf-8"))
+      impressoes[nome] = h.hexdigest()
+  return impressoes
+
+# Hash do código dos scripts de tratamento
+def impressao_codigo_tratamento():
+  h = hashlib.sha256()
+  for script in scripts_tratamento:
+    if os.path.exists(script):
+      with open(script, "rb") as arquivo:
+        h.update(arquivo.read())
+  return h.hexdigest()
+
+# Lê as impressões digitais gravadas na última execução (vazio se não houver,
+# se o código do tratamento mudou ou se falta algum arquivo da base, cujas
+# séries inalteradas não teriam de onde ser mantidas; as séries diárias também
+# entram nos arquivos das outras frequências, então o tratamento é refeito
+# por inteiro)
+def ler_impressoes(arquivo = arquivo_impressoes, pasta = "dados"):
+  if not tratamento_incremental or not os.path.exists(arquivo):
+    return {}
+  ausentes = [a for a in arquivos_frequencia.values() if not os.path.exists(f"{pasta}/{a}")]
+  if ausentes:
+    print(f"Arquivos ausentes em {pasta}/ ({', '.join(ausentes)}): tratando todas as séries")
+    return {}
+  with open(arquivo, encoding = "utf-8") as conteudo:
+    anteriores = json.load(conteudo)
+  if anteriores.get("codigo") != impressao_codigo_tratamento():
+    return {}
+  return anteriores.get("series", {})
+
+# Grava as impressões digitais da execução atual
+def gravar_impressoes(impressoes, arquivo = arquivo_impressoes):
+  conteudo = {"codigo": impressao_codigo_tratamento(), "series": dict(sorted(impressoes.items()))}
+  gravar_atomico(arquivo, json.dumps(conteudo, indent = 2).encode("utf-8"))
+
+# Mantém nas estruturas de dados brutos apenas os data frames de séries alteradas
+def filtrar_brutos(brutos, alteradas, metadados):
+  if isinstance(brutos, dict):
+    return {chave: filtrar_brutos(valor, alteradas, metadados) for chave, valor in brutos.items()}
+  return [
+      df for df in brutos
+      if any(nome in alteradas for _, nomes in percorrer_brutos(df, metadados) for nome in nomes)
+  ]
+
+# Aplica as colunas recalculadas sobre o arquivo armazenado: mantém as colunas
+# das séries inalteradas, substitui as recalculadas e descarta as de séries
+# alteradas ou removidas dos metadados
+def atualizar_armazenado(df, arquivo, descartar = ()):
+  if not tratamento_incremental or not os.path.exists(arquivo):
+    return df
+  armazenado = expandir_tipos(pd.read_parquet(arquivo))
+  manter = [c for c in armazenado.columns if c not in df.columns and c not in descartar]
+  if not manter:
+    return df
+  colunas = (
+      [c for c in armazenado.columns if c in manter or c in df.columns]
+      + [c for c in df.columns if c not in armazenado.columns]
+  )
+  armazenado = armazenado[manter].rename_axis(df.index.name)
+  armazenado = armazenado.loc[armazenado.notna().any(axis = "columns") | armazenado.index.isin(df.index)]
+  return cruzar_series([armazenado, df])[colunas]
+
+# Política de tipos dos arquivos armazenados: séries cujos valores sobrevivem à
+# conversão para float32 nas casas decimais em que são publicadas são gravadas
+# em float32, as demais em float64 (ausências ficam como nulos no parquet). A
+# coluna "Casas Decimais" dos metadados, se preenchida, fixa a precisão de
+# cada série; senão ela é inferida dos valores, até max_casas_decimais
+max_casas_decimais = 6
+
+# Menor número de casas decimais que representa exatamente todos os valores
+def casas_decimais(valores):
+  for casas in range(max_casas_decimais + 1):
+    if np.array_equal(np.round(valores, casas), valores):
+      return casas
+  return None
+
+# Tipo de armazenamento de uma série: float32 se os valores, arredondados nas
+# casas decimais da série, não mudam ao passar por float32
+def tipo_armazenamento(serie, casas = None):
+  valores = serie.dropna().to_numpy(dtype = np.float64)
+  if casas is None or not np.array_equal(np.round(valores, casas), valores):
+    casas = casas_decimais(valores)
+  if casas is None:
+    return "float64"
+  convertidos = np.round(valores.astype(np.float32).astype(np.float64), casas)
+  return "float32" if np.array_equal(convertidos, valores) else "float64"
+
+# Aplica a política de tipos às colunas de um data frame
+def compactar_tipos(df, metadados = None):
+  casas = {}
+  if metadados is not None and "Casas Decimais" in metadados.columns:
+    casas = pd.to_numeric(metadados["Casas Decimais"], errors = "coerce").dropna().astype(int).to_dict()
+  return df.astype({c: tipo_armazenamento(df[c], casas.get(c)) for c in df.columns})
+
+# Volta para float64 as colunas gravadas em float32 pela menor representação
+# decimal de cada valor (3.87 volta a ser 3.87, e não 3.869999885559082), para
+# reaproveitar os dados armazenados sem acumular erro de conversão
+def expandir_tipos(df):
+  if not (df.dtypes == np.float32).any():
+    return df
+  df = df.copy()
+  for c in df.columns[df.dtypes == np.float32]:
+    df[c] = df[c].to_numpy().astype(str).astype(np.float64)
+  return df
+
+# Grava também a tabela diária em formato longo (data, serie, valor), só com as
+# observações presentes (use DIARIA_LONGA=1)
+diaria_longa = os.environ.get("DIARIA_LONGA", "0") == "1"
+
+# Converte um data frame largo no formato longo, descartando as células vazias
+# (valores em float64, recuperados sem erro de conversão)
+def formato_longo(df):
+  longo = (
+      expandir_tipos(df)
+      .rename_axis("data")
+      .reset_index()
+      .melt(id_vars = "data", var_name = "serie", value_name = "valor")
+      .dropna(subset = ["valor"])
+      .reset_index(drop = True)
+  )
+  longo["serie"] = longo["serie"].astype("category")
+  return longo
+
+# Cópias sem compressão em Arrow IPC (.arrow) dos arquivos da base e das
+# previsões, que os consumidores abrem com mapeamento em memória: as colunas
+# numéricas são lidas sem cópia e os processos compartilham o cache de páginas
+# do sistema (use SAIDA_ARROW=1)
+saida_arrow = os.environ.get("SAIDA_ARROW", "0") == "1"
+
+# Grava um data frame em Arrow IPC sem compressão, mantendo o índice e os
+# valores ausentes como NaN (e não nulos) e as colunas float32 da base já em
+# float64 (ver expandir_tipos), para permitir a leitura sem cópia; a versão
+# do arquivo parquet de origem, se informada, vai nos metadados do esquema
+def gravar_arrow(df, caminho, versao = None):
+  df = expandir_tipos(df)
+  tabela = pa.Table.from_pandas(df, preserve_index = True)
+  for i, coluna in enumerate(df.columns):
+    if df[coluna].dtype.kind == "f":
+      tabela = tabela.set_column(i, tabela.field(i), pa.array(df[coluna].to_numpy()))
+  if versao is not None:
+    tabela = tabela.replace_schema_metadata({**(tabela.schema.metadata or {}), b"versao": versao.encode()})
+  buffer = pa.BufferOutputStream()
+  with pa.ipc.new_file(buffer, tabela.schema) as arquivo:
+    arquivo.write_table(tabela)
+  gravar_atomico(caminho, buffer.getvalue().to_pybytes())
+
+# Grava um data frame em parquet e, se habilitado, a cópia em Arrow IPC
+def gravar_tabela(df, caminho):
+  gravar_parquet(df, caminho)
+  if saida_arrow:
+    gravar_arrow(df, caminho.replace(".parquet", ".arrow"), versao_arquivo(caminho))
+
+# Versão de um arquivo parquet, gravada nas cópias derivadas dele (Arrow IPC
+# e banco de séries) para saber se estão atualizadas sem depender da data de
+# modificação (que é a do checkout): o id da execução no manifesto da pasta,
+# se o arquivo estiver nele, ou o sha256 do conteúdo
+def versao_arquivo(caminho):
+  pasta, arquivo = os.path.split(caminho)
+  manifesto = ler_manifesto(pasta or ".")
+  if manifesto is not None and arquivo in manifesto.get("arquivos", {}):
+    return str(manifesto["execucao"])
+  with open(caminho, "rb") as conteudo:
+    return hashlib.sha256(conteudo.read()).hexdigest()
+
+# Caminho da cópia Arrow IPC de um arquivo parquet, se existir e for da mesma
+# versão dele (ou se o parquet não existir)
+def copia_arrow(caminho):
+  arrow = caminho.replace(".parquet", ".arrow")
+  if not os.path.exists(arrow):
+    return None
+  if not os.path.exists(caminho):
+    return arrow
+  versao = (pa.ipc.open_file(pa.memory_map(arrow, "r")).schema.metadata or {}).get(b"versao")
+  return arrow if versao is not None and versao.decode() == versao_arquivo(caminho) else None
+
+# Abre um arquivo Arrow IPC com mapeamento em memória, só com as colunas e o
+# período (pelo índice de datas) pedidos; o período é recortado por posição
+# (busca binária no índice ordenado), e as colunas continuam apontando para o
+# arquivo mapeado, sem cópia
+def ler_arrow(caminho, colunas = None, inicio = None, fim = None):
+  tabela = pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+  indice = [i for i in (tabela.schema.pandas_metadata or {}).get("index_columns", []) if isinstance(i, str)]
+  if colunas is not None:
+    tabela = tabela.select([c for c in colunas if c in tabela.column_names] + indice)
+  if indice and (inicio is not None or fim is not None):
+    datas = tabela[indice[0]].to_numpy()
+    if datas.size > 1 and not (datas[1:] >= datas[:-1]).all():
+      manter = np.ones(datas.size, dtype = bool)
+      if inicio is not None:
+        manter &= datas >= pd.to_datetime(inicio).to_datetime64()
+      if fim is not None:
+        manter &= datas <= pd.to_datetime(fim).to_datetime64()
+      return tabela.filter(pa.array(manter)).to_pandas(split_blocks = True)
+    primeira = np.searchsorted(datas, pd.to_datetime(inicio).to_datetime64(), "left") if inicio is not None else 0
+    ultima = np.searchsorted(datas, pd.to_datetime(fim).to_datetime64(), "right") if fim is not None else datas.size
+    tabela = tabela.slice(primeira, max(0, ultima - primeira))
+  return tabela.to_pandas(split_blocks = True)
+
+# Lê da base apenas as séries e o período pedidos, devolvendo um data frame
+# largo indexado pela data (na ordem das séries pedidas). Os arquivos
+# df_*.parquet de dados/, com o manifesto, são a fonte da base: a cópia Arrow
+# IPC da frequência, se for da mesma versão, tem preferência, e sem ela são
+# lidas só as mesmas colunas e linhas do parquet; o banco de séries é derivado
+# deles para consultas por identificador
+def ler_series(series = None, freq = "Mensal", inicio = None, fim = None, pasta = "dados"):
+  inicio = pd.to_datetime(inicio) if inicio is not None else None
+  fim = pd.to_datetime(fim) if fim is not None else None
+  arquivo = f"{pasta}/{arquivos_frequencia[freq]}"
+
+  arrow = copia_arrow(arquivo)
+  if arrow is not None:
+    # Cópias gravadas em float64: expandir_tipos só converte as antigas
+    return expandir_tipos(ler_arrow(arrow, series, inicio, fim))
+
+  nomes = pq.read_schema(arquivo).names
+  filtros = [("data", ">=", inicio)] if inicio is not None else []
+  filtros += [("data", "<=", fim)] if fim is not None else []
+  return expandir_tipos(pd.read_parquet(
+      arquivo,
+      columns = [s for s in series if s in nomes] if series is not None else None,
+      filters = filtros or None
+      ))
+
+# Snapshots da base: os arquivos de todas as frequências são gravados em
+# temporários e só então renomeados, seguidos do manifesto da execução (id da
+# execução, linhas, colunas e resumo com checksum de cada série), gravado por
+# último; o manifesto permite comparar execuções sem reler os arquivos inteiros
+arquivo_manifesto = "manifesto.json"
+id_execucao = os.environ.get("GITHUB_RUN_ID", datetime.now().strftime("%Y%m%d%H%M%S"))
+
+# Resumo de cada série de um data frame: nº de observações, primeira e última
+# data e checksum das datas e valores presentes
+def resumo_series(df):
+  resumo = {}
+  for coluna in df.columns:
+    serie = df[coluna].dropna()
+    serie = serie[~serie.index.duplicated(keep = "last")]
+    checksum = hashlib.sha256(serie.index.to_numpy(dtype = "datetime64[ns]").view(np.int64).tobytes())
+    checksum.update(serie.to_numpy(dtype = np.float64).tobytes())
+    resumo[coluna] = {
+        "observacoes": int(serie.shape[0]),
+        "inicio": serie.index.min().strftime("%Y-%m-%d") if not serie.empty else None,
+        "fim": serie.index.max().strftime("%Y-%m-%d") if not serie.empty else None,
+        "checksum": checksum.hexdigest()
+    }
+  return resumo
+
+# Lê o manifesto de um snapshot (None se não houver)
+def ler_manifesto(pasta = "dados"):
+  caminho = f"{pasta}/{arquivo_manifesto}"
+  if not os.path.exists(caminho):
+    return None
+  with open(caminho, encoding = "utf-8") as conteudo:
+    return json.load(conteudo)
+
+# Resumo das séries de um arquivo de um snapshot, do manifesto se houver (senão
+# calculado lendo o arquivo)
+def resumo_arquivo(pasta, arquivo, manifesto = None):
+  if manifesto is not None and arquivo in manifesto.get("arquivos", {}):
+    return manifesto["arquivos"][arquivo]["series"]
+  if not os.path.exists(f"{pasta}/{arquivo}"):
+    return {}
+  return resumo_series(pd.read_parquet(f"{pasta}/{arquivo}"))
+
+# Compara as séries de um arquivo entre dois snapshots: primeiro pelos
+# checksums e, só nas séries com checksum diferente, pelos valores (novas
+# observações, revisões e observações removidas)
+def diferencas_arquivo(caminho_anterior, caminho_atual, resumo_anterior, resumo_atual):
+  diferencas = {}
+  alteradas = [
+      s for s in resumo_atual
+      if s in resumo_anterior and resumo_anterior[s]["checksum"] != resumo_atual[s]["checksum"]
+  ]
+  for serie in set(resumo_atual) - set(resumo_anterior):
+    diferencas[serie] = {"situacao": "nova", "novas": resumo_atual[serie]["observacoes"]}
+  for serie in set(resumo_anterior) - set(resumo_atual):
+    diferencas[serie] = {"situacao": "removida", "removidas": resumo_anterior[serie]["observacoes"]}
+  if not alteradas:
+    return diferencas
+
+  anterior = expandir_tipos(pd.read_parquet(caminho_anterior, columns = alteradas))
+  atual = expandir_tipos(pd.read_parquet(caminho_atual, columns = alteradas))
+  for serie in alteradas:
+    a = anterior[serie].dropna()
+    a = a[~a.index.duplicated(keep = "last")]
+    b = atual[serie].dropna()
+    b = b[~b.index.duplicated(keep = "last")]
+    comuns = a.index.intersection(b.index)
+    revisadas = comuns[a[comuns].to_numpy() != b[comuns].to_numpy()]
+    diferencas[serie] = {
+        "situacao": "alterada",
+        "novas": int(b.index.difference(a.index).shape[0]),
+        "revisadas": int(revisadas.shape[0]),
+        "removidas": int(a.index.difference(b.index).shape[0]),
+        "primeira_revisao": revisadas.min().strftime("%Y-%m-%d") if len(revisadas) > 0 else None
+    }
+  return diferencas
+
+# Compara dois snapshots da base (por exemplo, duas cópias de dados/ de
+# execuções diferentes), arquivo por arquivo
+def diferencas_snapshots(pasta_anterior, pasta_atual):
+  manifesto_anterior = ler_manifesto(pasta_anterior)
+  manifesto_atual = ler_manifesto(pasta_atual)
+  return {
+      arquivo: diferencas_arquivo(
+          f"{pasta_anterior}/{arquivo}",
+          f"{pasta_atual}/{arquivo}",
+          resumo_arquivo(pasta_anterior, arquivo, manifesto_anterior),
+          resumo_arquivo(pasta_atual, arquivo, manifesto_atual)
+          )
+      for arquivo in arquivos_frequencia.values()
+  }
+
+# Grava um snapshot da base: todos os arquivos vão primeiro para temporários,
+# depois são renomeados e, por fim, o manifesto é gravado; devolve as
+# diferenças de cada arquivo em relação ao snapshot anterior
+def gravar_snapshot(arquivos, pasta = "dados"):
+  manifesto_anterior = ler_manifesto(pasta)
+  manifesto = {"execucao": id_execucao, "data": datetime.now().isoformat(timespec = "seconds"), "arquivos": {}}
+  temporarios = {}
+  diferencas = {}
+
+  try:
+    for arquivo, df in arquivos.items():
+      caminho = f"{pasta}/{arquivo}"
+      temporarios[caminho] = f"{caminho}.{id_execucao}.tmp"
+      df.to_parquet(temporarios[caminho])
+      manifesto["arquivos"][arquivo] = {
+          "linhas": int(df.shape[0]),
+          "colunas": int(df.shape[1]),
+          "series": resumo_series(df)
+      }
+      diferencas[arquivo] = diferencas_arquivo(
+          caminho,
+          temporarios[caminho],
+          resumo_arquivo(pasta, arquivo, manifesto_anterior),
+          manifesto["arquivos"][arquivo]["series"]
+          )
+  except:
+    for temporario in temporarios.values():
+      if os.path.exists(temporario):
+        os.remove(temporario)
+    raise
+
+  for caminho, temporario in temporarios.items():
+    os.replace(temporario, caminho)
+  gravar_atomico(f"{pasta}/{arquivo_manifesto}", json.dumps(manifesto, indent = 2, ensure_ascii = False).encode("utf-8"))
+  return diferencas
+
+# Exibe as séries alteradas em relação ao snapshot anterior e as adiciona ao
+# resumo do GitHub Actions
+def relatar_diferencas(diferencas):
+  linhas = [
+      (arquivo, serie, detalhes)
+      for arquivo, series in diferencas.items()
+      for serie, detalhes in sorted(series.items())
+  ]
+  print(f"Séries alteradas em relação à execução anterior: {len(linhas)}")
+  for arquivo, serie, detalhes in linhas:
+    print(f"  {arquivo} {serie}: {json.dumps(detalhes, ensure_ascii = False)}")
+  if os.environ.get("GITHUB_STEP_SUMMARY") and linhas:
+    with open(os.environ["GITHUB_STEP_SUMMARY"], "a", encoding = "utf-8") as arquivo:
+      arquivo.write("### Séries alteradas\n\n| Arquivo | Série | Situação | Novas | Revisadas | Removidas | Primeira revisão |\n| --- | --- | --- | --- | --- | --- | --- |\n")
+      for nome, serie, d in linhas:
+        arquivo.write(
+            f"| {nome} | {serie} | {d['situacao']} | {d.get('novas', 0)} | {d.get('revisadas', 0)} "
+            f"| {d.get('removidas', 0)} | {d.get('primeira_revisao') or ''} |\n"
+            )
+
+# Banco local de séries (SQLite) para consultas pontuais e por período: as
+# observações têm chave (serie_id, frequencia, data), com o resumo de cada
+# série, a planilha de metadados e as previsões dos modelos ao lado. O banco é
+# derivado dos arquivos da base: 05-disponibilizacao.py o atualiza e, em uma
+# cópia nova do repositório, ele é reconstruído a partir deles na primeira
+# consulta (e sincronizado quando o manifesto muda)
+arquivo_banco = "dados/series.sqlite"
+
+esquema_banco = """
+CREATE TABLE IF NOT EXISTS observacoes (
+  serie_id TEXT NOT NULL,
+  frequencia TEXT NOT NULL,
+  data TEXT NOT NULL,
+  valor REAL NOT NULL,
+  PRIMARY KEY (serie_id, frequencia, data)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS series (
+  serie_id TEXT NOT NULL,
+  frequencia TEXT NOT NULL,
+  observacoes INTEGER,
+  inicio TEXT,
+  fim TEXT,
+  checksum TEXT,
+  PRIMARY KEY (serie_id, frequencia)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS previsoes (
+  alvo TEXT NOT NULL,
+  data TEXT NOT NULL,
+  tipo TEXT NOT NULL,
+  valor REAL,
+  intervalo_inferior REAL,
+  intervalo_superior REAL
+);
+CREATE INDEX IF NOT EXISTS previsoes_alvo ON previsoes (alvo, data);
+CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+# Abre o banco de séries, criando as tabelas se preciso
+def conectar_banco(arquivo = arquivo_banco):
+  os.makedirs(os.path.dirname(arquivo) or ".", exist_ok = True)
+  conexao = sqlite3.connect(arquivo, timeout = 60)
+  conexao.execute("PRAGMA journal_mode = WAL")
+  conexao.executescript(esquema_banco)
+  return conexao
+
+# Versão da base em dados/ (id da execução no manifesto ou, sem ele, a data
+# de modificação mais recente dos arquivos)
+def versao_base(pasta = "dados"):
+  manifesto = ler_manifesto(pasta)
+  if manifesto is not None:
+    return str(manifesto["execucao"])
+  arquivos = [f"{pasta}/{a}" for a in arquivos_frequencia.values() if os.path.exists(f"{pasta}/{a}")]
+  return str(max(os.path.getmtime(a) for a in arquivos)) if arquivos else ""
+
+# Atualiza o banco com os data frames de cada frequência em uma transação:
+# só as séries com checksum diferente do registrado são regravadas, e as que
+# não existem mais são removidas; a planilha de metadados, se informada, é
+# regravada por inteiro
+def gravar_banco_series(base, metadados = None, versao = None, arquivo = arquivo_banco):
+  conexao = conectar_banco(arquivo)
+  try:
+    with conexao:
+      for freq, df in base.items():
+        df = expandir_tipos(df)
+        resumo = resumo_series(df)
+        registrados = dict(conexao.execute("SELECT serie_id, checksum FROM series WHERE frequencia = ?", [freq]).fetchall())
+        alteradas = [s for s in resumo if registrados.get(s) != resumo[s]["checksum"]]
+        removidas = [s for s in registrados if s not in resumo]
+
+        for serie in alteradas + removidas:
+          conexao.execute("DELETE FROM observacoes WHERE serie_id = ? AND frequencia = ?", [serie, freq])
+          conexao.execute("DELETE FROM series WHERE serie_id = ? AND frequencia = ?", [serie, freq])
+        if not alteradas:
+          continue
+
+        longo = formato_longo(df[alteradas]).drop_duplicates(["data", "serie"], keep = "last")
+        conexao.executemany(
+            "INSERT INTO observacoes VALUES (?, ?, ?, ?)",
+            zip(longo.serie.astype(str), [freq] * len(longo), longo.data.dt.strftime("%Y-%m-%d"), longo.valor.astype(float))
+            )
+        conexao.executemany(
+            "INSERT INTO series VALUES (?, ?, ?, ?, ?, ?)",
+            [(s, freq, r["observacoes"], r["inicio"], r["fim"], r["checksum"]) for s, r in resumo.items() if s in alteradas]
+            )
+
+      if metadados is not None:
+        conexao.execute("DROP TABLE IF EXISTS metadados")
+        metadados.reset_index(drop = True).to_sql("metadados", conexao, index = False)
+        conexao.execute("DROP VIEW IF EXISTS series_metadados")
+        conexao.execute(
+            "CREATE VIEW series_metadados AS SELECT s.*, m.* FROM series s "
+            "LEFT JOIN metadados m ON m.Identificador = s.serie_id"
+            )
+      conexao.execute("INSERT OR REPLACE INTO controle VALUES ('versao_base', ?)", [versao if versao is not None else versao_base()])
+  finally:
+    conexao.close()
+
+# Sincroniza o banco com os arquivos da base quando ele não existe ou foi
+# gerado a partir de outra versão deles
+def sincronizar_banco_series(arquivo = arquivo_banco, pasta = "dados"):
+  versao = versao_base(pasta)
+  if os.path.exists(arquivo):
+    conexao = conectar_banco(arquivo)
+    try:
+      registrada = conexao.execute("SELECT valor FROM controle WHERE chave = 'versao_base'").fetchone()
+    finally:
+      conexao.close()
+    if registrada is not None and registrada[0] == versao:
+      return
+  base = {
+      freq: pd.read_parquet(f"{pasta}/{nome}")
+      for freq, nome in arquivos_frequencia.items()
+      if os.path.exists(f"{pasta}/{nome}")
+  }
+  metadados = pd.read_parquet(arquivo_metadados) if os.path.exists(arquivo_metadados) else None
+  gravar_banco_series(base, metadados, versao, arquivo)
+
+# Consulta séries do banco pelo identificador, frequência e período, devolvendo
+# um data frame largo indexado pela data (na ordem das séries pedidas); a
+# base é lida pela data de cada observação, sem carregar os arquivos inteiros
+def obter_series(ids = None, inicio = None, fim = None, freq = "Mensal", arquivo = arquivo_banco):
+  sincronizar_banco_series(arquivo)
+  consulta = "SELECT data, serie_id, valor FROM observacoes WHERE frequencia = ?"
+  parametros = [freq]
+  if ids is not None:
+    consulta += f" AND serie_id IN ({', '.join('?' * len(ids))})"
+    parametros += list(ids)
+  if inicio is not None:
+    consulta += " AND data >= ?"
+    parametros.append(pd.to_datetime(inicio).strftime("%Y-%m-%d"))
+  if fim is not None:
+    consulta += " AND data <= ?"
+    parametros.append(pd.to_datetime(fim).strftime("%Y-%m-%d"))
+
+  conexao = conectar_banco(arquivo)
+  try:
+    df = pd.read_sql_query(consulta, conexao, params = parametros)
+  finally:
+    conexao.close()
+  df = (
+      df
+      .assign(data = lambda x: pd.to_datetime(x.data, format = "%Y-%m-%d"))
+      .pivot(index = "data", columns = "serie_id", values = "valor")
+      .rename_axis(index = "data", columns = None)
+  )
+  return df.filter(ids) if ids is not None else df
+
+# Última observação de uma série no banco (data e valor)
+def ultima_observacao(serie, freq = "Mensal", arquivo = arquivo_banco):
+  sincronizar_banco_series(arquivo)
+  conexao = conectar_banco(arquivo)
+  try:
+    linha = conexao.execute(
+        "SELECT data, valor FROM observacoes WHERE serie_id = ? AND frequencia = ? ORDER BY data DESC LIMIT 1",
+        [serie, freq]
+        ).fetchone()
+  finally:
+    conexao.close()
+  return (pd.to_datetime(linha[0]), linha[1]) if linha is not None else None
+
+# Grava as previsões de um modelo em previsao/ (parquet e, se habilitada, a
+# cópia Arrow IPC) e no banco de séries, com a versão do parquet (que o
+# app.py compara antes de usar o banco)
+def gravar_previsao(df, alvo):
+  gravar_tabela(df, f"previsao/{alvo}.parquet")
+  versao = versao_arquivo(f"previsao/{alvo}.parquet")
+  linhas = df.reindex(columns = ["Tipo", "Valor", "Intervalo Inferior", "Intervalo Superior"])
+  conexao = conectar_banco()
+  try:
+    with conexao:
+      conexao.execute("DELETE FROM previsoes WHERE alvo = ?", [alvo])
+      conexao.executemany(
+          "INSERT INTO previsoes VALUES (?, ?, ?, ?, ?, ?)",
+          [
+              (alvo, data.strftime("%Y-%m-%d"), tipo, *[None if pd.isna(v) else float(v) for v in valores])
+              for data, tipo, *valores in linhas.itertuples()
+          ]
+          )
+      conexao.execute("INSERT OR REPLACE INTO controle VALUES (?, ?)", [f"previsao_{alvo}", versao])
+  finally:
+    conexao.close()
+
+# Planilha de metadados (Google Sheets)
+url_metadados = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx"
+arquivo_metadados = f"{pasta_servidor_local}/metadados.parquet" if servidor_local else "dados/metadados.parquet"
+validade_metadados = pd.Timedelta(hours = float(os.environ.get("VALIDADE_METADADOS_HORAS", 12)))
+
+# Metadados e índices de linhas por coluna, carregados uma vez por execução
+metadados_em_memoria = None
+indices_metadados = {}
+
+# Momento do download da cópia local dos metadados, guardado nos metadados do
+# parquet (a data de modificação do arquivo é a do checkout no CI); None se
+# ausente
+def baixado_em_metadados(arquivo = arquivo_metadados):
+  if not os.path.exists(arquivo):
+    return None
+  baixado_em = (pq.read_schema(arquivo).metadata or {}).get(b"baixado_em")
+  return pd.Timestamp(baixado_em.decode()) if baixado_em is not None else None
+
+# Carrega a planilha de metadados uma única vez: usa a cópia local (parquet,
+# colunas como texto) enquanto estiver na validade e só então baixa de novo;
+# retorna os metadados indexados pelo Identificador
+def carregar_metadados(validade = validade_metadados):
+  global metadados_em_memoria, indices_metadados
+
+  if metadados_em_memoria is not None:
+    return metadados_em_memoria
+
+  baixado_em = baixado_em_metadados(arquivo_metadados)
+  if os.path.exists(arquivo_metadados) and (
+      modo_offline or
+      (baixado_em is not None and pd.Timestamp.now() - baixado_em < validade)
+      ):
+    df = pd.read_parquet(arquivo_metadados)
+  else:
+    df = ler_resposta(url_metadados, pd.read_excel, sheet_name = "Metadados", dtype = str)
+    tabela = pa.Table.from_pandas(df, preserve_index = False)
+    tabela = tabela.replace_schema_metadata({
+        **(tabela.schema.metadata or {}),
+        b"baixado_em": pd.Timestamp.now().isoformat().encode()
+        })
+    buffer = BytesIO()
+    pq.write_table(tabela, buffer)
+    gravar_atomico(arquivo_metadados, buffer.getvalue())
+
+  indices_metadados = {
+      coluna: df.groupby(coluna).indices
+      for coluna in ["Fonte", "Frequência", "Forma de Coleta"]
+  }
+  metadados_em_memoria = df.set_index("Identificador", drop = False).rename_axis(None)
+  return metadados_em_memoria
+
+# Seleciona linhas dos metadados por fonte, frequência e forma de coleta,
+# usando os índices pré-calculados, na ordem original da planilha
+def selecionar_metadados(fonte = None, frequencia = None, forma_de_coleta = None):
+  metadados = carregar_metadados()
+  linhas = np.arange(metadados.shape[0])
+  for coluna, valor in [("Fonte", fonte), ("Frequência", frequencia), ("Forma de Coleta", forma_de_coleta)]:
+    if valor is not None:
+      linhas = np.intersect1d(linhas, indices_metadados[coluna].get(valor, []))
+  return metadados.iloc[linhas].reset_index(drop = True)
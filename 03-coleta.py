@@ -1,106 +1,122 @@
-# Planilha de metadados
-df_metadados = pd.read_excel(
-    io = "https://docs.google.com/spreadsheets/d/1x8Ugm7jVO7XeNoxiaFPTPm1mfVc3JUNvvVqVjCioYmE/export?format=xlsx",
-    sheet_name = "Metadados"
-    )
+# Coleta incremental do BCB/SGS e BCB/ODATA: busca apenas o final das séries já armazenadas
+# em dados/ (use COLETA_INCREMENTAL=0 para forçar a coleta completa)
+coleta_incremental = os.environ.get("COLETA_INCREMENTAL", "1") == "1"
 
+# Planilha de metadados (baixada uma vez e compartilhada com as demais etapas)
+df_metadados = carregar_metadados()
 
-# Coleta dados do BCB/SGS
-input_bcb_sgs = (
-    df_metadados
-    .query("Fonte == 'BCB/SGS' and `Forma de Coleta` == 'API'")
-    .reset_index(drop = True)
-)
+# Tarefas de coleta de todas as fontes, executadas em paralelo ao final
+tarefas_coleta = []
+
+
+# Agenda coleta de dados do BCB/SGS
+input_bcb_sgs = selecionar_metadados(fonte = "BCB/SGS", forma_de_coleta = "API")
 
 df_bruto_bcb_sgs = {"Diária": [], "Mensal": [], "Trimestral": [], "Anual": []}
 
 for serie in input_bcb_sgs.index:
   ser = input_bcb_sgs.iloc[serie]
-  df_temp = coleta_bcb_sgs(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"], 
-      freq = ser["Frequência"]
-      )
-  df_bruto_bcb_sgs[ser["Frequência"]].append(df_temp)
+  tarefas_coleta.append({
+      "funcao": coleta_bcb_sgs_incremental if coleta_incremental else coleta_bcb_sgs,
+      "argumentos": {
+          "codigo": ser["Input de Coleta"],
+          "nome": ser["Identificador"],
+          "freq": ser["Frequência"]
+          },
+      "destino": df_bruto_bcb_sgs[ser["Frequência"]]
+      })
 
 
-# Coleta dados do BCB/ODATA
-input_bcb_odata = (
-    df_metadados
-    .query("Fonte == 'BCB/ODATA' and `Forma de Coleta` == 'API'")
-    .reset_index(drop = True)
-)
+# Agenda coleta de dados do BCB/ODATA
+input_bcb_odata = selecionar_metadados(fonte = "BCB/ODATA", forma_de_coleta = "API")
 
 df_bruto_bcb_odata = []
 
 for serie in input_bcb_odata.index:
   ser = input_bcb_odata.iloc[serie]
-  df_temp = coleta_bcb_odata(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_bcb_odata.append(df_temp)
+  tarefas_coleta.append({
+      "funcao": coleta_bcb_odata_incremental if coleta_incremental else coleta_bcb_odata,
+      "argumentos": {
+          "codigo": ser["Input de Coleta"],
+          "nome": ser["Identificador"]
+          },
+      "destino": df_bruto_bcb_odata
+      })
 
 
-# Coleta dados do IPEADATA
-input_ipeadata = (
-    df_metadados
-    .query("Fonte == 'IPEADATA' and `Forma de Coleta` == 'API'")
-    .reset_index(drop = True)
-)
+# Agenda coleta de dados do IPEADATA
+input_ipeadata = selecionar_metadados(fonte = "IPEADATA", forma_de_coleta = "API")
 
 df_bruto_ipeadata = {"Diária": [], "Mensal": []}
 
 for serie in input_ipeadata.index:
   ser = input_ipeadata.iloc[serie]
-  df_temp = coleta_ipeadata(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_ipeadata[ser["Frequência"]].append(df_temp)
+  tarefas_coleta.append({
+      "funcao": coleta_ipeadata,
+      "argumentos": {
+          "codigo": ser["Input de Coleta"],
+          "nome": ser["Identificador"]
+          },
+      "destino": df_bruto_ipeadata[ser["Frequência"]]
+      })
 
 
-# Coleta dados do IBGE/SIDRA
-input_sidra = (
-    df_metadados
-    .query("Fonte == 'IBGE/SIDRA' and `Forma de Coleta` == 'API'")
-    .reset_index(drop = True)
-)
+# Agenda coleta de dados do IBGE/SIDRA
+input_sidra = selecionar_metadados(fonte = "IBGE/SIDRA", forma_de_coleta = "API")
 
 df_bruto_ibge_sidra = {"Mensal": [], "Trimestral": []}
 
 for serie in input_sidra.index:
   ser = input_sidra.iloc[serie]
-  df_temp = coleta_ibge_sidra(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_ibge_sidra[ser["Frequência"]].append(df_temp)
+  tarefas_coleta.append({
+      "funcao": coleta_ibge_sidra,
+      "argumentos": {
+          "codigo": ser["Input de Coleta"],
+          "nome": ser["Identificador"]
+          },
+      "destino": df_bruto_ibge_sidra[ser["Frequência"]]
+      })
 
 
-# Coleta dados do FRED
-input_fred = (
-    df_metadados
-    .query("Fonte == 'FRED' and `Forma de Coleta` == 'API'")
-    .reset_index(drop = True)
-)
+# Agenda coleta de dados do FRED
+input_fred = selecionar_metadados(fonte = "FRED", forma_de_coleta = "API")
 
 df_bruto_fred = {"Diária": [], "Mensal": [], "Trimestral": []}
 
 for serie in input_fred.index:
   ser = input_fred.iloc[serie]
-  df_temp = coleta_fred(
-      codigo = ser["Input de Coleta"],
-      nome = ser["Identificador"]
-      )
-  df_bruto_fred[ser["Frequência"]].append(df_temp)
+  tarefas_coleta.append({
+      "funcao": coleta_fred,
+      "argumentos": {
+          "codigo": ser["Input de Coleta"],
+          "nome": ser["Identificador"]
+          },
+      "destino": df_bruto_fred[ser["Frequência"]]
+      })
+
+
+# Agenda coleta de dados do IFI
+input_ifi = selecionar_metadados(fonte = "IFI")
+
+df_bruto_ifi = []
+
+tarefas_coleta.append({
+    "funcao": coleta_ifi,
+    "argumentos": {
+        "codigo": input_ifi["Input de Coleta"][0],
+        "nome": input_ifi["Identificador"][0]
+        },
+    "destino": df_bruto_ifi
+    })
+
+
+# Coleta todas as séries em paralelo e preenche os dados brutos na ordem dos metadados
+resultados_coleta = coletar_em_paralelo(tarefas_coleta)
 
+for tarefa, df_temp in zip(tarefas_coleta, resultados_coleta):
+  tarefa["destino"].append(df_temp)
 
-# Coleta dados do IFI
-input_ifi = (
-    df_metadados
-    .query("Fonte == 'IFI'")
-    .reset_index(drop = True)
-)
+df_bruto_ifi = df_bruto_ifi[0]
 
-df_bruto_ifi = coleta_ifi(input_ifi["Input de Coleta"][0], input_ifi["Identificador"][0])
+# Métricas de retentativas da coleta
+relatar_metricas_coleta()
@@ -6,20 +6,20 @@ if not os.path.exists(pasta):
 
 # Diária
 df_diaria = (
-    df_tratado_bcb_sgs["Diária"]
-    .join(
-        other=df_tratado_ipeadata["Diária"].reset_index().assign(
+    cruzar_series([
+        df_tratado_bcb_sgs["Diária"],
+        df_tratado_ipeadata["Diária"].reset_index().assign(
             data=lambda x: pd.to_datetime(x['data'].dt.strftime("%Y-%m-%d"))
         ).set_index("data"),
-        how="outer"
-    )
-    .join(other=df_tratado_fred["Diária"], how="outer")
+        df_tratado_fred["Diária"]
+    ])
     .reset_index()
     .assign(data=lambda x: pd.to_datetime(x['data']))  
     .query("data >= @pd.to_datetime('2000-01-01')")
     .set_index('data')
 )
-df_diaria.to_parquet(f"{pasta}/df_diaria.parquet")
+df_diaria = atualizar_armazenado(df_diaria, f"{pasta}/df_diaria.parquet", series_alteradas | series_removidas)
+df_diaria = compactar_tipos(df_diaria, df_metadados)
 
 # Mensal
 temp_lista = [
@@ -31,12 +31,12 @@ temp_lista = [
 ]
 
 df_mensal = (
-  temp_lista[0]
-  .join(other = temp_lista[1:], how = "outer")
+  cruzar_series(temp_lista)
   .query("index >= @pd.to_datetime('2000-01-01')")
   .astype(float)
   )
-df_mensal.to_parquet(f"{pasta}/df_mensal.parquet")
+df_mensal = atualizar_armazenado(df_mensal, f"{pasta}/df_mensal.parquet", series_alteradas | series_removidas)
+df_mensal = compactar_tipos(df_mensal, df_metadados)
 
 # Trimestral
 temp_lista = [
@@ -48,13 +48,13 @@ temp_lista = [
 ]
 
 df_trimestral = (
-  temp_lista[0]
-  .join(other = temp_lista[1:], how = "outer")
+  cruzar_series(temp_lista)
   .query("index >= @pd.to_datetime('2000-01-01')")
   .astype(float)
 )
 df_trimestral.index = pd.to_datetime(df_trimestral.index)
-df_trimestral.to_parquet(f"{pasta}/df_trimestral.parquet")
+df_trimestral = atualizar_armazenado(df_trimestral, f"{pasta}/df_trimestral.parquet", series_alteradas | series_removidas)
+df_trimestral = compactar_tipos(df_trimestral, df_metadados)
 
 # Anual
 df_anual = (
@@ -62,4 +62,32 @@ df_anual = (
   .query("index >= @pd.to_datetime('2000-01-01')")
   .astype(float)
 )
-df_anual.to_parquet(f"{pasta}/df_anual.parquet")
+df_anual = atualizar_armazenado(df_anual, f"{pasta}/df_anual.parquet", series_alteradas | series_removidas)
+df_anual = compactar_tipos(df_anual, df_metadados)
+
+
+# Grava o snapshot da base (arquivos de todas as frequências de uma vez, com o
+# manifesto da execução) e relata o que mudou desde a execução anterior
+base = {"Diária": df_diaria, "Mensal": df_mensal, "Trimestral": df_trimestral, "Anual": df_anual}
+relatar_diferencas(gravar_snapshot({arquivos_frequencia[f]: df for f, df in base.items()}, pasta))
+
+# Cópias em Arrow IPC para leitura com mapeamento em memória
+if saida_arrow:
+  for f, df in base.items():
+    gravar_arrow(df, f"{pasta}/{arquivos_frequencia[f]}".replace(".parquet", ".arrow"), id_execucao)
+
+# Atualiza as séries alteradas no banco local de séries, com os metadados
+gravar_banco_series(base, df_metadados, id_execucao)
+
+# Remove a antiga base em formato longo particionada (dados/series), que
+# duplicava os arquivos da base; as consultas usam ler_series e o banco
+if os.path.isdir(f"{pasta}/series"):
+  shutil.rmtree(f"{pasta}/series")
+
+# Diária em formato longo (data, serie, valor), sem as células vazias do
+# cruzamento entre fontes
+if diaria_longa:
+  gravar_parquet(formato_longo(df_diaria), f"{pasta}/df_diaria_longo.parquet", index = False)
+
+# Registra as impressões digitais das séries tratadas nesta execução
+gravar_impressoes(impressoes_tratamento)
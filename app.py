@@ -3,15 +3,53 @@ from shiny import App, ui, render
 from faicons import icon_svg
 from shinyswatch import theme
 import pandas as pd
+import pyarrow as pa
 import plotnine as p9
 from mizani import breaks
+import os
+import hashlib
+import sqlite3
 
 
 # Dados ----
-cambio = pd.read_parquet("previsao/cambio.parquet")
-ipca = pd.read_parquet("previsao/ipca.parquet")
-pib = pd.read_parquet("previsao/pib.parquet")
-selic = pd.read_parquet("previsao/selic.parquet")
+
+# Lê a previsão do banco local de séries ou da cópia Arrow IPC com mapeamento
+# em memória, se existirem e forem da mesma versão (sha256) do arquivo parquet,
+# que é a fonte da previsão; senão, lê o parquet
+def ler_previsao(nome):
+    parquet = f"previsao/{nome}.parquet"
+    arrow = f"previsao/{nome}.arrow"
+    banco = "dados/series.sqlite"
+    with open(parquet, "rb") as arquivo:
+        versao = hashlib.sha256(arquivo.read()).hexdigest()
+    if os.path.exists(banco):
+        conexao = sqlite3.connect(banco)
+        try:
+            registrada = conexao.execute("SELECT valor FROM controle WHERE chave = ?", [f"previsao_{nome}"]).fetchone()
+            df = pd.read_sql_query(
+                "SELECT data, valor AS Valor, tipo AS Tipo, intervalo_inferior AS [Intervalo Inferior], "
+                "intervalo_superior AS [Intervalo Superior] FROM previsoes WHERE alvo = ? ORDER BY rowid",
+                conexao,
+                params = [nome]
+            ) if registrada == (versao,) else pd.DataFrame()
+        finally:
+            conexao.close()
+        if not df.empty:
+            return (
+                df
+                .set_index(pd.to_datetime(df.pop("data")).rename(None))
+                .astype({"Valor": float, "Intervalo Inferior": float, "Intervalo Superior": float})
+            )
+    if os.path.exists(arrow):
+        leitor = pa.ipc.open_file(pa.memory_map(arrow, "r"))
+        if (leitor.schema.metadata or {}).get(b"versao") == versao.encode():
+            return leitor.read_all().to_pandas(split_blocks = True)
+    return pd.read_parquet(parquet)
+
+cambio = ler_previsao("cambio")
+ipca = ler_previsao("ipca")
+pib = ler_previsao("pib")
+selic = ler_previsao("selic")
 
 datas = {
     "min": pib.index.min().date(),
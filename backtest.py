@@ -0,0 +1,243 @@
+# Avalia fora da amostra, com origens móveis (rolling origin), os modelos das
+# especificações de 06-ipca.py a 09-selic.py e um conjunto de modelos
+# candidatos: em cada dobra (origem) alvo e regressores são preparados
+# (transformações, preenchimentos, seleção de colunas e filtros) só com os
+# dados até a origem, o modelo é estimado com as mesmas defasagens e
+# transformações (PowerTransformer em Y e nos regressores) dos modelos de
+# previsão e prevê recursivamente os h períodos seguintes. Os regressores do
+# período de teste seguem o último valor observado na origem, como nos
+# cenários dos modelos (ou os valores observados, com
+# CENARIO_BACKTEST=observado); dummies sazonais seguem o calendário e os
+# regressores que são o alvo defasado são refeitos com a trajetória prevista.
+# As matrizes transformadas de cada dobra são calculadas uma vez e
+# compartilhadas entre os candidatos; dobras x candidatos são avaliados em
+# paralelo em processos criados por fork. Resultados em backtest/: previsões
+# por dobra (<alvo>.parquet) e RMSE/MAE por horizonte (metricas.parquet).
+# Uso: python backtest.py [--sequencial] [scripts]
+import sys, os, time, warnings, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
+from sklearn.ensemble import VotingRegressor, RandomForestRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.linear_model import Ridge, Lasso, BayesianRidge, HuberRegressor
+from sklearn.preprocessing import PowerTransformer
+from sklearn.svm import LinearSVR
+import pandas as pd
+import numpy as np
+
+scripts_previsao = ["06-ipca.py", "07-cambio.py", "08-pib.py", "09-selic.py"]
+
+# Nº de dobras (origens) por alvo, distância entre origens, tamanho da janela
+# de treinamento (0 = janela expansiva, desde o início da amostra), tamanho
+# mínimo da amostra de treinamento, cenário dos regressores no período de
+# teste (constante ou observado), nº de processos e pasta dos resultados
+dobras_backtest = int(os.environ.get("DOBRAS_BACKTEST", 60))
+passo_backtest = int(os.environ.get("PASSO_BACKTEST", 1))
+janela_backtest = int(os.environ.get("JANELA_BACKTEST", 0))
+treino_minimo_backtest = int(os.environ.get("TREINO_MINIMO_BACKTEST", 36))
+cenario_backtest = os.environ.get("CENARIO_BACKTEST", "constante")
+processos_backtest = int(os.environ.get("PROCESSOS_BACKTEST", os.cpu_count() or 1))
+pasta_backtest = os.environ.get("PASTA_BACKTEST", "backtest")
+
+# Modelos candidatos, avaliados junto com os das especificações (que
+# prevalecem em caso de mesmo nome)
+semente = 1984
+candidatos_backtest = {
+    "Ridge": Ridge(),
+    "Lasso": Lasso(alpha = 0.01),
+    "Bayesian Ridge": BayesianRidge(),
+    "Huber": HuberRegressor(),
+    "Linear SVR": LinearSVR(random_state = semente, dual = True, max_iter = 100000),
+    "Ensemble": VotingRegressor([
+        ("bayes", BayesianRidge()),
+        ("svr", LinearSVR(random_state = semente, dual = True, max_iter = 100000)),
+        ("ridge", Ridge(random_state = semente))
+        ]),
+    "Random Forest": RandomForestRegressor(n_estimators = 100, random_state = semente)
+}
+
+# Funções compartilhadas e especificações dos modelos, registradas sem
+# executar as previsões
+ambiente = {"__name__": "__main__", "especificacoes_registradas": []}
+exec(open("01-bibliotecas.py", encoding = "utf-8").read(), ambiente)
+exec(open("02-funcoes.py", encoding = "utf-8").read(), ambiente)
+exec(open("nucleo_previsao.py", encoding = "utf-8").read(), ambiente)
+
+scripts = [a for a in sys.argv[1:] if not a.startswith("--")] or scripts_previsao
+for script in scripts:
+  exec(open(script, encoding = "utf-8").read(), dict(ambiente))
+
+# Posição da primeira observação de treinamento de uma dobra
+def inicio_dobra(fim):
+  return max(0, fim + 1 - janela_backtest) if janela_backtest > 0 else 0
+
+# Alvo observado e candidatos de cada especificação, e dobras de cada alvo
+# (posição da última observação de treinamento de cada origem); a amostra
+# completa só define as datas das origens e os valores observados no teste
+alvos_backtest = {}
+for espec in ambiente["especificacoes_registradas"]:
+  y = ambiente["preparar_alvo"](espec)["y"]
+  origens = [
+      fim for fim in range(y.shape[0] - 1 - espec["h"], -1, -passo_backtest)
+      if fim + 1 - inicio_dobra(fim) >= treino_minimo_backtest
+  ][:dobras_backtest][::-1]
+  alvos_backtest[espec["alvo"]] = {
+      "espec": espec,
+      "y": y,
+      "lags": espec["lags"],
+      "h": espec["h"],
+      "candidatos": {**candidatos_backtest, **espec["modelos"]},
+      "origens": origens
+  }
+
+# Matrizes transformadas de cada dobra, guardadas por processo e usadas por
+# todos os candidatos avaliados nele
+matrizes_backtest = {}
+
+# Regressores do período de teste de uma dobra: último valor observado na
+# origem (ou valores observados, preparados só com os dados até o fim do
+# teste) e dummies sazonais pelo calendário
+def exog_teste_dobra(espec, exog_treino, periodo):
+  if cenario_backtest == "observado":
+    exog_teste = ambiente["preparar_alvo"](espec, periodo[-1])["exog"].reindex(periodo)
+  else:
+    exog_teste = exog_treino.iloc[[-1] * periodo.shape[0]].set_index(periodo)
+  for coluna in exog_teste.columns.intersection(periodo.month_name().unique()):
+    exog_teste[coluna] = (periodo.month_name() == coluna).astype(int)
+  return exog_teste[exog_treino.columns]
+
+# Prepara alvo e regressores só com os dados até a origem de uma dobra,
+# transforma-os com os dados de treinamento e monta as defasagens (lag_1 a
+# lag_p) e regressores de treinamento, a janela inicial e os regressores do
+# período de teste; None se a dobra não tem os regressores da especificação
+def matrizes_dobra(alvo, fim):
+  if (alvo, fim) in matrizes_backtest:
+    return matrizes_backtest[(alvo, fim)]
+  dados = alvos_backtest[alvo]
+  espec, lags, h = dados["espec"], dados["lags"], dados["h"]
+  inicio = inicio_dobra(fim)
+
+  try:
+    preparado = ambiente["preparar_alvo"](espec, dados["y"].index[fim])
+    y_treino = preparado["y"].iloc[inicio:fim + 1]
+    exog_treino = preparado["exog"].reindex(y_treino.index)
+    exog_teste = exog_teste_dobra(espec, exog_treino, dados["y"].index[fim + 1:fim + 1 + h])
+  except KeyError:
+    matrizes_backtest[(alvo, fim)] = None
+    return None
+
+  transformador_y = PowerTransformer().fit(y_treino.to_frame())
+  y_transformado = transformador_y.transform(y_treino.to_frame()).ravel()
+  transformador_exog = PowerTransformer().fit(exog_treino)
+  exog_transformado = transformador_exog.transform(exog_treino)
+
+  n = y_transformado.shape[0]
+  matrizes_backtest[(alvo, fim)] = {
+      "X": np.column_stack(
+          [y_transformado[lags - l:n - l] for l in range(1, lags + 1)] + [exog_transformado[lags:n]]
+          ),
+      "y": y_transformado[lags:],
+      "janela": y_transformado[-lags:],
+      "y_treino": y_treino.to_numpy(),
+      "exog_teste": exog_teste,
+      "exog_teste_transformado": transformador_exog.transform(exog_teste),
+      "transformador_y": transformador_y,
+      "transformador_exog": transformador_exog
+  }
+  return matrizes_backtest[(alvo, fim)]
+
+# Estima um candidato em uma dobra e prevê recursivamente os h períodos
+# seguintes à origem, na escala original do alvo; os regressores que são o
+# alvo defasado usam os valores observados até a origem e depois os previstos
+def avaliar(tarefa):
+  alvo, fim, candidato = tarefa
+  dados = alvos_backtest[alvo]
+  matrizes = matrizes_dobra(alvo, fim)
+  if matrizes is None:
+    return pd.DataFrame()
+  with warnings.catch_warnings():
+    warnings.simplefilter("ignore", category = ConvergenceWarning)
+    regressor = clone(dados["candidatos"][candidato]).fit(matrizes["X"], matrizes["y"])
+
+  defasados = dados["espec"].get("regressores_defasados", {})
+  janela = matrizes["janela"].copy()
+  trajetoria = list(matrizes["y_treino"])
+  for passo in range(dados["h"]):
+    exog_passo = matrizes["exog_teste_transformado"][passo]
+    if defasados:
+      linha = matrizes["exog_teste"].iloc[[passo]].copy()
+      for coluna, k in defasados.items():
+        linha[coluna] = trajetoria[-k]
+      exog_passo = matrizes["transformador_exog"].transform(linha)[0]
+    X = np.concatenate((janela[::-1][:dados["lags"]], exog_passo))
+    janela = np.append(janela, regressor.predict(X.reshape(1, -1)))
+    trajetoria.append(matrizes["transformador_y"].inverse_transform(janela[-1:].reshape(-1, 1))[0, 0])
+  previsto = np.array(trajetoria[-dados["h"]:])
+
+  teste = dados["y"].iloc[fim + 1:fim + 1 + dados["h"]]
+  return pd.DataFrame({
+      "alvo": alvo,
+      "modelo": candidato,
+      "origem": dados["y"].index[fim],
+      "horizonte": np.arange(1, dados["h"] + 1),
+      "data": teste.index,
+      "observado": teste.to_numpy(),
+      "previsto": previsto
+      })
+
+tarefas = [
+    (alvo, fim, candidato)
+    for alvo, dados in alvos_backtest.items()
+    for fim in dados["origens"]
+    for candidato in dados["candidatos"]
+]
+paralelo = "--sequencial" not in sys.argv and "fork" in multiprocessing.get_all_start_methods()
+
+# Avalia as tarefas agrupadas por dobra (cada grupo vai para um mesmo processo
+# e reaproveita as matrizes da dobra)
+inicio = time.time()
+if paralelo:
+  with ProcessPoolExecutor(
+      max_workers = max(1, processos_backtest),
+      mp_context = multiprocessing.get_context("fork")
+      ) as executor:
+    resultados = list(executor.map(
+        avaliar,
+        tarefas,
+        chunksize = max(len(dados["candidatos"]) for dados in alvos_backtest.values())
+        ))
+else:
+  resultados = [avaliar(tarefa) for tarefa in tarefas]
+
+# Salva as previsões e calcula RMSE e MAE por alvo, modelo e horizonte
+previsoes = pd.concat(resultados, ignore_index = True).assign(erro = lambda x: x.previsto - x.observado)
+os.makedirs(pasta_backtest, exist_ok = True)
+for alvo, df in previsoes.groupby("alvo"):
+  ambiente["gravar_parquet"](df.reset_index(drop = True), f"{pasta_backtest}/{alvo}.parquet")
+metricas = (
+    previsoes
+    .groupby(["alvo", "modelo", "horizonte"])
+    .erro
+    .agg(
+        rmse = lambda e: np.sqrt((e ** 2).mean()),
+        mae = lambda e: e.abs().mean(),
+        dobras = "count"
+        )
+    .reset_index()
+)
+ambiente["gravar_parquet"](metricas, f"{pasta_backtest}/metricas.parquet")
+
+# Relata os modelos de cada alvo ordenados pelo RMSE médio entre horizontes
+resumo = (
+    metricas
+    .groupby(["alvo", "modelo"], as_index = False)
+    .agg(rmse = ("rmse", "mean"), mae = ("mae", "mean"), dobras = ("dobras", "max"))
+    .sort_values(["alvo", "rmse"])
+)
+print(resumo.to_string(index = False, float_format = "{:.4f}".format))
+print(f"Backtest: {len(previsoes)} previsões de {len(tarefas)} estimações em {time.time() - inicio:.1f}s")
+if os.environ.get("GITHUB_STEP_SUMMARY"):
+  with open(os.environ["GITHUB_STEP_SUMMARY"], "a", encoding = "utf-8") as arquivo:
+    arquivo.write("### Backtest\n\n| Alvo | Modelo | RMSE médio | MAE médio | Dobras |\n| --- | --- | --- | --- | --- |\n")
+    for linha in resumo.itertuples():
+      arquivo.write(f"| {linha.alvo} | {linha.modelo} | {linha.rmse:.4f} | {linha.mae:.4f} | {linha.dobras} |\n")
@@ -0,0 +1,465 @@
+# Bibliotecas dos modelos de previsão
+from skforecast.ForecasterAutoreg import ForecasterAutoreg
+from sklearn.preprocessing import PowerTransformer
+from sklearn.base import clone
+from sklearn.ensemble import VotingRegressor
+from sklearn.linear_model import (
+    LinearRegression, Ridge, Lasso, ElasticNet, BayesianRidge, ARDRegression, HuberRegressor
+    )
+from sklearn.svm import LinearSVR
+from io import StringIO
+import google.generativeai as genai
+import multiprocessing, warnings, joblib, sklearn, skforecast
+
+
+# Núcleo compartilhado pelos modelos de previsão (06-ipca.py a 09-selic.py):
+# cada modelo descreve seu alvo em uma especificação (dicionário) e
+# executar_previsao() faz as etapas comuns a todos eles. Chaves:
+#   alvo           identificador da série prevista (nome dos arquivos gerados)
+#   rotulo         valor da coluna Tipo para o histórico do alvo
+#   frequencia     "Mensal" ou "Trimestral"
+#   series         regressores candidatos (sem o alvo)
+#   inicio_treino  data inicial da amostra de treinamento
+#   h              horizonte de previsão
+#   lags           defasagens do alvo
+#   modelos        {Tipo: regressor} dos modelos reestimados
+#   x_reg          seleção final de regressores (ou "regressores", função que
+#                  recebe os dados brutos do alvo e retorna os regressores)
+#   cenarios       função que recebe o contexto da previsão e retorna os
+#                  cenários dos regressores no período de previsão
+#   prompt         função que recebe o período de previsão e retorna o prompt
+#                  do modelo de IA
+# Opcionais: sem_transformacao (séries usadas em nível), derivar (função que
+# recebe e retorna os regressores transformados, antes do filtro da amostra),
+# dummies_sazonais (True para adicionar dummies mensais), semente, n_boot,
+# periodos_fora_amostra (nº de períodos do cenário e da previsão do modelo de
+# IA, se diferente de h) e regressores_defasados ({regressor: k} dos regressores que são o alvo defasado
+# em k períodos, refeitos com a trajetória prevista no backtest.py)
+
+# Dados preparados por frequência (séries lidas e transformadas uma vez),
+# compartilhados entre os modelos executados no mesmo processo e preservados
+# se este arquivo for executado de novo; são descartados quando a base muda
+if "dados_previsao" not in globals():
+  dados_previsao = {}
+
+# Lista onde executar_previsao() registra as especificações em vez de
+# executá-las, se definida antes dos scripts dos modelos (ex.: backtest.py)
+if "especificacoes_registradas" not in globals():
+  especificacoes_registradas = None
+
+# Frequência dos índices e passo do período de previsão de cada frequência
+indices_previsao = {"Mensal": "MS", "Trimestral": "QS"}
+
+# Intervalos por bootstrap: os caminhos simulados de regressores lineares (ou
+# VotingRegressor de lineares) são calculados de uma vez, passo a passo, e os
+# dos demais em partes, em processos paralelos; os resíduos sorteados são os
+# mesmos do predict_interval() do skforecast 0.13 para a mesma semente (use
+# BOOTSTRAP_VETORIZADO=0 para usar o predict_interval() do skforecast)
+bootstrap_vetorizado = os.environ.get("BOOTSTRAP_VETORIZADO", "1") == "1"
+processos_bootstrap = int(os.environ.get("PROCESSOS_BOOTSTRAP", os.cpu_count() or 1))
+regressores_lineares = (
+    LinearRegression, Ridge, Lasso, ElasticNet, BayesianRidge, ARDRegression, HuberRegressor, LinearSVR
+    )
+
+# Modelos estimados guardados no cache (cache/modelos), com os resíduos do
+# treinamento, pelo hash da estrutura (alvo, tipo, lags, hiperparâmetros,
+# transformações e versões das bibliotecas) e dos dados de treinamento: sem
+# mudança nos dados o modelo não é reestimado; se os dados mudaram, regressores
+# com warm_start partem da estimativa anterior da mesma estrutura (use
+# REAJUSTE_INCREMENTAL=0 para reestimá-los do zero)
+reajuste_incremental = os.environ.get("REAJUSTE_INCREMENTAL", "1") == "1"
+
+
+# Função para transformar dados, conforme definido nos metadados
+def transformar(x, tipo):
+
+  switch = {
+      "1": lambda x: x,
+      "2": lambda x: x.diff(),
+      "3": lambda x: x.diff().diff(),
+      "4": lambda x: np.log(x),
+      "5": lambda x: np.log(x).diff(),
+      "6": lambda x: np.log(x).diff().diff()
+  }
+
+  if tipo not in switch:
+      raise ValueError("Tipo inválido")
+
+  return switch[tipo](x)
+
+# Descarta os dados preparados se a base de séries mudou desde a preparação
+def validar_dados_previsao():
+  versao = versao_base()
+  if dados_previsao.get("versao") != versao:
+    dados_previsao.clear()
+    dados_previsao.update({"versao": versao, "bases": {}, "paineis": {}})
+
+# Todas as séries de uma frequência da base, lidas uma vez por processo
+def base_previsao(freq):
+  validar_dados_previsao()
+  if freq not in dados_previsao["bases"]:
+    dados_previsao["bases"][freq] = obter_series(freq = freq)
+  return dados_previsao["bases"][freq]
+
+# Painel de todas as séries na frequência dos modelos, em índice regular (o
+# skforecast usa a frequência do índice): nos mensais, as séries anuais e
+# trimestrais são repetidas nos meses de cada período; nos trimestrais, as
+# séries mensais são agregadas pela média do trimestre
+def painel_previsao(freq):
+  validar_dados_previsao()
+  if freq not in dados_previsao["paineis"]:
+    if freq == "Mensal":
+      bruto = (
+          base_previsao("Mensal")
+          .asfreq("MS")
+          .join(other = base_previsao("Anual").asfreq("MS").ffill(), how = "outer")
+          .join(other = base_previsao("Trimestral").asfreq("MS").ffill(), how = "outer")
+      )
+    elif freq == "Trimestral":
+      bruto = cruzar_series([
+          agregar_frequencia(base_previsao("Mensal"), "QS"),
+          agregar_frequencia(base_previsao("Trimestral"), "QS")
+      ]).asfreq("QS")
+    else:
+      raise Exception(f"Frequência sem modelos de previsão: {freq}")
+    dados_previsao["paineis"][freq] = {"bruto": bruto.rename_axis("data"), "transformado": {}}
+  return dados_previsao["paineis"][freq]
+
+# Série do painel transformada conforme os metadados, calculada uma vez por
+# frequência
+def serie_transformada(freq, serie):
+  painel = painel_previsao(freq)
+  if serie not in painel["transformado"]:
+    painel["transformado"][serie] = transformar(
+        painel["bruto"][serie],
+        carregar_metadados().loc[serie, "Transformação"]
+        )
+  return painel["transformado"][serie]
+
+# Dummies sazonais (meses, exceto dezembro) de um índice mensal
+def dummies_sazonais(indice):
+  return (
+      pd.get_dummies(indice.month_name())
+      .astype(int)
+      .drop(labels = "December", axis = "columns")
+      .set_index(indice)
+  )
+
+# Cenário de um regressor pela mediana histórica do mesmo mês (ou trimestre)
+# na amostra de treinamento
+def cenario_sazonal(x, serie, periodo, inicio_treino):
+  sazonalidade = (lambda i: i.quarter) if periodo.freqstr.startswith("Q") else (lambda i: i.month)
+  historico = x[serie].dropna()
+  historico = historico[historico.index >= inicio_treino]
+  medianas = historico.groupby(sazonalidade(historico.index)).median()
+  return pd.DataFrame(
+      {serie: medianas.reindex(sazonalidade(periodo)).to_numpy()},
+      index = periodo.rename("data")
+      )
+
+# Prepara alvo e regressores de uma especificação a partir do painel da sua
+# frequência: recorta as séries no período com observações, transforma os
+# regressores, filtra a amostra, remove regressores com 20% ou mais de NAs e
+# preenche os NAs restantes com a vizinhança; com fim, usa só os dados até
+# essa data (as transformações dos metadados só usam o passado)
+def preparar_alvo(espec, fim = None):
+  freq = espec["frequencia"]
+  painel = painel_previsao(freq)
+  dados = painel["bruto"].filter([espec["alvo"]] + espec["series"])
+  if fim is not None:
+    dados = dados.loc[:fim]
+  dados = dados.loc[dados.apply(pd.Series.first_valid_index).min():dados.apply(pd.Series.last_valid_index).max()]
+
+  # Separa Y e X, com as transformações dos metadados
+  y = dados[espec["alvo"]].dropna()
+  x = dados.drop(labels = espec["alvo"], axis = "columns").copy()
+  for col in x.columns.to_list():
+    if col not in espec.get("sem_transformacao", []):
+      x[col] = serie_transformada(freq, col).reindex(x.index)
+  if "derivar" in espec:
+    x = espec["derivar"](x)
+
+  # Filtra amostra
+  inicio_treino = espec["inicio_treino"]
+  y = y[y.index >= inicio_treino]
+  x_alem_de_y = x.query("index >= @y.index.max()")
+  x = x.query("index >= @inicio_treino and index <= @y.index.max()")
+
+  # Remove variáveis que possuem 20% ou mais de NAs em relação ao nº de obs.
+  # de Y e preenche NAs restantes com a vizinhança
+  prop_na = x.isnull().sum() / y.shape[0]
+  x = x.drop(labels = prop_na[prop_na >= 0.2].index.to_list(), axis = "columns")
+  x = x.bfill().ffill()
+  if espec.get("dummies_sazonais", False):
+    x = x.join(other = dummies_sazonais(y.index), how = "outer")
+
+  # Regressores dos modelos
+  if "regressores" in espec:
+    exog = (
+        espec["regressores"](dados)
+        .query("index >= @inicio_treino and index <= @y.index.max()")
+        .bfill()
+        .ffill()
+    )
+  else:
+    exog = x[espec["x_reg"]]
+
+  return {"dados": dados, "y": y, "x": x, "x_alem_de_y": x_alem_de_y, "exog": exog}
+
+# Hash dos dados de treinamento (valores, índice e nomes)
+def hash_dados(df):
+  nomes = df.columns.to_list() if isinstance(df, pd.DataFrame) else [df.name]
+  return hashlib.sha256(
+      pd.util.hash_pandas_object(df, index = True).to_numpy().tobytes() + repr(nomes).encode()
+      ).hexdigest()
+
+# Hash da estrutura de um modelo, independente dos dados de treinamento
+def hash_estrutura(espec, tipo, regressor):
+  return hashlib.sha256(repr([
+      espec["alvo"],
+      tipo,
+      espec["lags"],
+      joblib.hash(clone(regressor)),
+      repr(PowerTransformer()),
+      skforecast.__version__,
+      sklearn.__version__
+      ]).encode()).hexdigest()
+
+# Lê um modelo estimado do cache (None se não existir) e o marca como usado
+# recentemente
+def ler_modelo_cache(chave):
+  caminho = f"{pasta_cache}/modelos/{chave}.joblib"
+  if not usar_cache or chave is None or not os.path.exists(caminho):
+    return None
+  os.utime(caminho)
+  return joblib.load(caminho)
+
+# Guarda um modelo estimado no cache e o registra como o último da sua estrutura
+def gravar_modelo_cache(chave, estrutura, modelo):
+  if not usar_cache:
+    return
+  buffer = BytesIO()
+  joblib.dump(modelo, buffer)
+  gravar_atomico(f"{pasta_cache}/modelos/{chave}.joblib", buffer.getvalue())
+  gravar_atomico(f"{pasta_cache}/modelos/{estrutura}.json", json.dumps({"modelo": chave}).encode("utf-8"))
+
+# Último modelo estimado de uma estrutura, se o seu regressor aceitar
+# warm_start (ex.: HuberRegressor), para reestimação a partir dele
+def modelo_anterior(estrutura):
+  caminho = f"{pasta_cache}/modelos/{estrutura}.json"
+  if not reajuste_incremental or not usar_cache or not os.path.exists(caminho):
+    return None
+  with open(caminho, encoding = "utf-8") as arquivo:
+    anterior = ler_modelo_cache(json.load(arquivo)["modelo"])
+  if anterior is None or "warm_start" not in anterior.regressor.get_params(deep = False):
+    return None
+  return anterior
+
+# Estima os modelos de uma especificação com a amostra completa, reaproveitando
+# os modelos do cache estimados com os mesmos dados
+def ajustar_modelos(espec, y, exog):
+  dados = hash_dados(y) + hash_dados(exog)
+  modelos = {}
+  for tipo, regressor in espec["modelos"].items():
+    estrutura = hash_estrutura(espec, tipo, regressor)
+    chave = hashlib.sha256(f"{estrutura}|{dados}".encode()).hexdigest()
+    modelos[tipo] = ler_modelo_cache(chave)
+    if modelos[tipo] is not None:
+      print(f"{espec['rotulo']} ({tipo}): modelo reaproveitado do cache")
+      continue
+
+    anterior = modelo_anterior(estrutura)
+    if anterior is not None:
+      anterior.regressor.set_params(warm_start = True)
+      anterior.fit(y, exog)
+      anterior.regressor.set_params(warm_start = False)
+      modelos[tipo] = anterior
+      print(f"{espec['rotulo']} ({tipo}): modelo reestimado a partir do anterior")
+    else:
+      modelos[tipo] = ForecasterAutoreg(
+          regressor = regressor,
+          lags = espec["lags"],
+          transformer_y = PowerTransformer(),
+          transformer_exog = PowerTransformer()
+          )
+      modelos[tipo].fit(y, exog)
+      print(f"{espec['rotulo']} ({tipo}): modelo estimado")
+    gravar_modelo_cache(chave, estrutura, modelos[tipo])
+  return modelos
+
+# Período de previsão fora da amostra, a partir da última observação do alvo
+def periodo_fora_amostra(ultima_data, h, freq):
+  return pd.date_range(start = ultima_data, periods = h + 1, freq = indices_previsao[freq])[1:]
+
+# Verifica se as previsões do regressor são uma combinação linear dos
+# regressores (as de todos os caminhos podem ser calculadas de uma vez)
+def regressor_linear(regressor):
+  if isinstance(regressor, VotingRegressor):
+    return all(regressor_linear(estimador) for estimador in regressor.estimators_)
+  return isinstance(regressor, regressores_lineares)
+
+# Resíduos sorteados para cada caminho do bootstrap (n_boot x h), com as
+# sementes por caminho do skforecast (cada semente distinta é sorteada uma vez)
+def residuos_bootstrap(modelo, h, n_boot, semente):
+  sementes = np.random.default_rng(seed = semente).integers(low = 0, high = 10000, size = n_boot)
+  unicas, posicoes = np.unique(sementes, return_inverse = True)
+  sorteios = np.stack([
+      np.random.default_rng(seed = s).choice(a = modelo.in_sample_residuals, size = h, replace = True)
+      for s in unicas
+  ])
+  return sorteios[posicoes]
+
+# Caminhos do bootstrap com as previsões de todos os caminhos calculadas de uma
+# vez em cada passo (n_boot x h)
+def caminhos_vetorizados(modelo, janela, exog_valores, residuos):
+  n_boot, h = residuos.shape
+  caminhos = np.empty((n_boot, janela.size + h))
+  caminhos[:, :janela.size] = janela
+  for passo in range(h):
+    X = caminhos[:, janela.size + passo - modelo.lags]
+    if exog_valores is not None:
+      X = np.column_stack((X, np.broadcast_to(exog_valores[passo], (n_boot, exog_valores.shape[1]))))
+    with warnings.catch_warnings():
+      warnings.simplefilter("ignore", category = UserWarning)
+      caminhos[:, janela.size + passo] = modelo.regressor.predict(X).ravel() + residuos[:, passo]
+  return caminhos[:, janela.size:]
+
+# Caminhos do bootstrap um a um, como no skforecast (n_boot x h)
+def caminhos_sequenciais(modelo, janela, exog_valores, residuos):
+  caminhos = np.empty(residuos.shape)
+  for i in range(residuos.shape[0]):
+    janela_caminho = janela.copy()
+    for passo in range(residuos.shape[1]):
+      previsao = modelo._recursive_predict(
+          steps = 1,
+          last_window = janela_caminho,
+          exog = exog_valores[passo:] if exog_valores is not None else None
+          ) + residuos[i, passo]
+      caminhos[i, passo] = previsao[0]
+      janela_caminho = np.append(janela_caminho[1:], previsao)
+  return caminhos
+
+# Caminhos do bootstrap divididos em partes simuladas em processos paralelos
+# (criados por fork, que herdam o modelo sem serializá-lo)
+def caminhos_em_processos(modelo, janela, exog_valores, residuos):
+  partes = [p for p in np.array_split(np.arange(residuos.shape[0]), processos_bootstrap) if p.size > 0]
+  if (
+      len(partes) <= 1 or
+      multiprocessing.current_process().daemon or
+      "fork" not in multiprocessing.get_all_start_methods()
+      ):
+    return caminhos_sequenciais(modelo, janela, exog_valores, residuos)
+
+  contexto = multiprocessing.get_context("fork")
+  def simular(parte, emissor):
+    emissor.send(caminhos_sequenciais(modelo, janela, exog_valores, residuos[parte]))
+    emissor.close()
+
+  execucoes = []
+  for parte in partes:
+    receptor, emissor = contexto.Pipe(duplex = False)
+    processo = contexto.Process(target = simular, args = (parte, emissor))
+    processo.start()
+    emissor.close()
+    execucoes.append((processo, receptor))
+  caminhos = np.concatenate([receptor.recv() for _, receptor in execucoes])
+  for processo, _ in execucoes:
+    processo.join()
+  return caminhos
+
+# Previsão com intervalo por bootstrap de um modelo, equivalente ao
+# predict_interval() do skforecast 0.13 (resíduos do treinamento, sem
+# diferenciação); nos demais casos usa o próprio predict_interval()
+def prever_intervalo_bootstrap(modelo, h, exog, n_boot = 5000, semente = 1984, intervalo = [5, 95]):
+  if not bootstrap_vetorizado or modelo.differentiation is not None or not hasattr(modelo, "_create_predict_inputs"):
+    return modelo.predict_interval(steps = h, exog = exog, interval = intervalo, n_boot = n_boot, random_state = semente)
+
+  previsao = modelo.predict(steps = h, exog = exog)
+  janela, _, exog_valores = modelo._create_predict_inputs(steps = h, exog = exog)
+  residuos = residuos_bootstrap(modelo, h, n_boot, semente)
+  if regressor_linear(modelo.regressor):
+    caminhos = caminhos_vetorizados(modelo, janela, exog_valores, residuos)
+  else:
+    caminhos = caminhos_em_processos(modelo, janela, exog_valores, residuos)
+  if modelo.transformer_y is not None:
+    with warnings.catch_warnings():
+      warnings.simplefilter("ignore", category = UserWarning)
+      caminhos = modelo.transformer_y.inverse_transform(caminhos.reshape(-1, 1)).reshape(caminhos.shape)
+
+  limites = (
+      pd.DataFrame(caminhos.T, index = previsao.index)
+      .quantile(q = np.array(intervalo) / 100, axis = 1)
+      .transpose()
+      .set_axis(["lower_bound", "upper_bound"], axis = "columns")
+  )
+  return pd.concat((previsao, limites), axis = 1)
+
+# Previsões com intervalos por bootstrap de cada modelo
+def prever_intervalos(modelos, h, exog, n_boot = 5000, semente = 1984):
+  return [
+      prever_intervalo_bootstrap(modelo, h, exog, n_boot = n_boot, semente = semente)
+      .assign(Tipo = tipo)
+      .rename(
+         columns = {
+            "pred": "Valor",
+            "lower_bound": "Intervalo Inferior",
+            "upper_bound": "Intervalo Superior"
+            }
+      )
+      for tipo, modelo in modelos.items()
+  ]
+
+# Previsão do modelo de IA a partir do histórico do alvo e dos regressores
+# (enviado como dados/<alvo>.csv)
+def prever_ia(espec, historico, periodo):
+  arquivo_csv = f"dados/{espec['alvo']}.csv"
+  historico.to_csv(arquivo_csv)
+  genai.configure(api_key = os.environ["GEMINI_API_KEY"])
+  modelo_ia = genai.GenerativeModel(model_name = "gemini-1.5-pro")
+  arquivo = genai.upload_file(arquivo_csv)
+  return pd.read_csv(
+      filepath_or_buffer = StringIO(modelo_ia.generate_content([espec["prompt"](periodo), arquivo]).text),
+      names = ["date", "Valor"],
+      skiprows = 1,
+      index_col = "date",
+      converters = {"date": pd.to_datetime}
+      ).assign(Tipo = "IA")
+
+# Executa a previsão de uma especificação: prepara os dados, reestima os
+# modelos, constrói os cenários, produz as previsões e as salva em previsao/;
+# retorna o contexto da previsão (dados, modelos e previsões), ou None se as
+# especificações estiverem sendo apenas registradas
+def executar_previsao(espec):
+  if especificacoes_registradas is not None:
+    especificacoes_registradas.append(espec)
+    return None
+
+  contexto = preparar_alvo(espec)
+  contexto["modelos"] = ajustar_modelos(espec, contexto["y"], contexto["exog"])
+
+  ultima_data = next(iter(contexto["modelos"].values())).last_window.index[-1]
+  contexto["ultima_data"] = ultima_data
+  contexto["periodo"] = periodo_fora_amostra(
+      ultima_data,
+      espec.get("periodos_fora_amostra", espec["h"]),
+      espec["frequencia"]
+      )
+
+  contexto["cenarios"] = espec["cenarios"](contexto)
+  contexto["previsoes"] = prever_intervalos(
+      contexto["modelos"],
+      espec["h"],
+      contexto["cenarios"],
+      n_boot = espec.get("n_boot", 5000),
+      semente = espec.get("semente", 1984)
+      )
+  contexto["previsoes"].append(
+      prever_ia(espec, contexto["y"].to_frame().join(contexto["exog"]), contexto["periodo"])
+      )
+
+  # Salvar previsões
+  os.makedirs("previsao", exist_ok = True)
+  pd.concat(
+      [contexto["y"].rename("Valor").to_frame().assign(Tipo = espec["rotulo"])] + contexto["previsoes"]
+      ).pipe(gravar_previsao, espec["alvo"])
+  return contexto
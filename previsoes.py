@@ -0,0 +1,75 @@
+# Executa os modelos de previsão, por padrão em paralelo: a base de séries é
+# lida e preparada uma vez por frequência (nucleo_previsao.py) no processo
+# principal e compartilhada, somente leitura, com um processo por modelo criado
+# por fork; a saída de cada modelo vai para logs/<modelo>.log e o código de
+# saída é diferente de zero se algum modelo falhar.
+# Uso: python previsoes.py [--sequencial] [scripts]
+import sys, os, time, traceback, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+scripts_previsao = ["06-ipca.py", "07-cambio.py", "08-pib.py", "09-selic.py"]
+
+# Nº de processos (padrão: nº de núcleos, limitado ao nº de modelos) e pasta
+# dos logs de cada modelo
+processos_previsao = int(os.environ.get("PROCESSOS_PREVISAO", os.cpu_count() or 1))
+pasta_logs = os.environ.get("PASTA_LOGS_PREVISAO", "logs")
+
+# Funções compartilhadas e dados preparados por frequência, herdados pelos
+# processos dos modelos
+ambiente = {"__name__": "__main__"}
+exec(open("01-bibliotecas.py", encoding = "utf-8").read(), ambiente)
+exec(open("02-funcoes.py", encoding = "utf-8").read(), ambiente)
+exec(open("nucleo_previsao.py", encoding = "utf-8").read(), ambiente)
+for freq in ambiente["indices_previsao"]:
+  ambiente["painel_previsao"](freq)
+
+# Executa um script de modelo com os dados já preparados, redirecionando a
+# saída (inclusive a de bibliotecas em C) para o log do modelo se informado
+def executar_script(script, log = None):
+  inicio = time.time()
+  if log is not None:
+    sys.stdout.flush()
+    sys.stderr.flush()
+    arquivo_log = open(log, "w", encoding = "utf-8")
+    os.dup2(arquivo_log.fileno(), 1)
+    os.dup2(arquivo_log.fileno(), 2)
+  try:
+    exec(open(script, encoding = "utf-8").read(), dict(ambiente))
+    situacao = "concluído"
+  except Exception:
+    traceback.print_exc()
+    situacao = "falhou"
+  finally:
+    sys.stdout.flush()
+    sys.stderr.flush()
+  return script, situacao, time.time() - inicio
+
+scripts = [a for a in sys.argv[1:] if not a.startswith("--")] or scripts_previsao
+paralelo = "--sequencial" not in sys.argv and "fork" in multiprocessing.get_all_start_methods()
+
+inicio = time.time()
+if paralelo:
+  os.makedirs(pasta_logs, exist_ok = True)
+  with ProcessPoolExecutor(
+      max_workers = max(1, min(processos_previsao, len(scripts))),
+      mp_context = multiprocessing.get_context("fork")
+      ) as executor:
+    tarefas = [
+        executor.submit(executar_script, script, f"{pasta_logs}/{os.path.splitext(script)[0]}.log")
+        for script in scripts
+    ]
+    resultados = [tarefa.result() for tarefa in tarefas]
+else:
+  resultados = [executar_script(script) for script in scripts]
+
+# Relata a situação de cada modelo
+for script, situacao, duracao in resultados:
+  print(f"{script}: {situacao} em {duracao:.1f}s")
+print(f"Previsões: {time.time() - inicio:.1f}s no total")
+if os.environ.get("GITHUB_STEP_SUMMARY"):
+  with open(os.environ["GITHUB_STEP_SUMMARY"], "a", encoding = "utf-8") as arquivo:
+    arquivo.write("### Previsões\n\n| Modelo | Situação | Duração (s) |\n| --- | --- | --- |\n")
+    for script, situacao, duracao in resultados:
+      arquivo.write(f"| {script} | {situacao} | {duracao:.1f} |\n")
+
+sys.exit(1 if any(situacao != "concluído" for _, situacao, _ in resultados) else 0)
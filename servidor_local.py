@@ -0,0 +1,393 @@
+# Servidor HTTP local que substitui as APIs usadas pelo projeto (BCB/SGS,
+# BCB/ODATA, IPEADATA, IBGE/SIDRA, FRED, IFI e a planilha de metadados do
+# Google Sheets), para executar 03-coleta.py e os scripts 06-09 sem internet.
+#
+# Uso:
+#   python servidor_local.py [--porta 8765] [--latencia 0.2] [--taxa-erro 0.05]
+#                            [--banda 500000] [--gravar]
+#   SERVIDOR_LOCAL=http://127.0.0.1:8765 python -c "exec(open('01-bibliotecas.py').read()); ..."
+#
+# As requisições chegam como http://127.0.0.1:8765/<esquema>/<servidor original><caminho>?<consulta>
+# (ver url_destino em 02-funcoes.py). A resposta vem, nesta ordem, de:
+#   1. gravação da URL exata em fixtures/;
+#   2. gravação da mesma consulta com outro período ou página, recortada no
+#      período (dataInicial/dataFinal do SGS, "Data ge" do ODATA) e na página
+#      ($skip/$top) pedidos; se há gravações da consulta mas nenhuma cobre o
+#      pedido, a resposta é 404;
+#   3. dados sintéticos determinísticos no formato da fonte.
+# Com --gravar, URLs sem gravação exata são buscadas na API original e gravadas.
+
+# Bibliotecas
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+from io import BytesIO
+import argparse, csv, hashlib, json, math, os, random, re, threading, time
+import pandas as pd
+import requests
+
+
+# Definições e configurações globais
+pasta_fixtures = "fixtures"
+tamanho_bloco = 16 * 1024 # bytes enviados por vez quando há limite de banda
+
+
+# Metadados sintéticos: uma série por fonte e frequência usada em 04-tratamento.py
+# (as séries do BCB/ODATA seguem a ordem esperada pelo tratamento)
+metadados_sinteticos = pd.DataFrame(
+    [
+        ["selic", "BCB/SGS", "API", "Diária", "432", "1"],
+        ["ipca", "BCB/SGS", "API", "Mensal", "433", "1"],
+        ["uci_geral_fgv", "BCB/SGS", "API", "Trimestral", "1344", "1"],
+        ["meta_inflacao", "BCB/SGS", "API", "Anual", "13521", "1"],
+        ["expec_ipca_top5_curto_prazo", "BCB/ODATA", "API", "Mensal", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Mensais?$filter=Indicador%20eq%20'IPCA'%20and%20tipoCalculo%20eq%20'C'&$format=text/csv", "1"],
+        ["expec_ipca_top5_medio_prazo", "BCB/ODATA", "API", "Mensal", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTop5Mensais?$filter=Indicador%20eq%20'IPCA'%20and%20tipoCalculo%20eq%20'M'&$format=text/csv", "1"],
+        ["expec_selic", "BCB/ODATA", "API", "Mensal", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoAnuais?$filter=Indicador%20eq%20'Selic'&$format=text/csv", "1"],
+        ["expec_cambio", "BCB/ODATA", "API", "Mensal", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativaMercadoMensais?$filter=Indicador%20eq%20'C%C3%A2mbio'&$format=text/csv", "1"],
+        ["expec_ipca_12m", "BCB/ODATA", "API", "Mensal", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoInflacao12Meses?$filter=Indicador%20eq%20'IPCA'%20and%20Suavizada%20eq%20'S'&$format=text/csv", "1"],
+        ["expec_pib", "BCB/ODATA", "API", "Trimestral", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoTrimestrais?$filter=Indicador%20eq%20'PIB%20Total'&$format=text/csv", "1"],
+        ["expec_primario", "BCB/ODATA", "API", "Mensal", "https://olinda.bcb.gov.br/olinda/servico/Expectativas/versao/v1/odata/ExpectativasMercadoAnuais?$filter=Indicador%20eq%20'Resultado%20prim%C3%A1rio'&$format=text/csv", "1"],
+        ["cambio_brl_eur", "IPEADATA", "API", "Diária", "GM366_ERV366", "5"],
+        ["ibov", "IPEADATA", "API", "Mensal", "ANBIMA12_IBVSP12", "5"],
+        ["pmc_volume", "IBGE/SIDRA", "API", "Mensal", "https://apisidra.ibge.gov.br/values/t/8880/n1/all/v/7169/p/all/c11046/56734", "2"],
+        ["pib", "IBGE/SIDRA", "API", "Trimestral", "https://apisidra.ibge.gov.br/values/t/5932/n1/all/v/6562/p/all/c11255/90707", "1"],
+        ["epu_us", "FRED", "API", "Diária", "USEPUINDXD", "1"],
+        ["fed_funds", "FRED", "API", "Mensal", "FEDFUNDS", "2"],
+        ["us_gdp", "FRED", "API", "Trimestral", "GDPC1", "5"],
+        ["hiato_produto", "IFI", "Planilha", "Trimestral", "https://www12.senado.leg.br/ifi/dados/arquivos/estimativas-do-hiato-do-produto-ifi/@@download/file", "1"]
+    ],
+    columns = ["Identificador", "Fonte", "Forma de Coleta", "Frequência", "Input de Coleta", "Transformação"]
+)
+
+# Frequência das séries sintéticas por código de coleta
+frequencias_sinteticas = dict(zip(metadados_sinteticos["Input de Coleta"], metadados_sinteticos["Frequência"]))
+
+
+# Valor sintético determinístico de uma série em uma data (igual em qualquer período consultado)
+def valor_sintetico(codigo, datas):
+  semente = int(hashlib.sha256(str(codigo).encode()).hexdigest()[:6], 16) % 1000
+  dias = pd.DatetimeIndex(datas).to_julian_date().to_numpy()
+  return (10 + semente / 100 + 3 * (1 + pd.Series(dias / 90 + semente).map(math.sin))).round(2).to_list()
+
+# Datas sintéticas de uma série, conforme a frequência
+def datas_sinteticas(freq, inicio = "2000-01-01", fim = None):
+  fim = pd.Timestamp.today().normalize() if fim is None else pd.to_datetime(fim)
+  regra = {"Diária": "B", "Mensal": "MS", "Trimestral": "QS", "Anual": "YS"}.get(freq, "MS")
+  return pd.date_range(pd.to_datetime(inicio), fim, freq = regra)
+
+# Converte um data frame em bytes de uma planilha xlsx, com linhas de título
+# opcionais antes do cabeçalho
+def para_xlsx(df, aba, titulos = []):
+  buffer = BytesIO()
+  with pd.ExcelWriter(buffer, engine = "openpyxl") as escritor:
+    df.to_excel(escritor, sheet_name = aba, index = False, startrow = len(titulos))
+    for linha, titulo in enumerate(titulos, start = 1):
+      escritor.sheets[aba].cell(row = linha, column = 1).value = titulo
+  return buffer.getvalue()
+
+# BCB/SGS: CSV "data";"valor" com datas dd/mm/aaaa e vírgula decimal
+def gerar_sgs(caminho, consulta):
+  codigo = re.search(r"bcdata\.sgs\.(\d+)", caminho).group(1)
+  freq = frequencias_sinteticas.get(codigo, "Mensal")
+  inicio = pd.to_datetime(consulta.get("dataInicial", "01/01/2000"), format = "%d/%m/%Y")
+  fim = min(
+      pd.to_datetime(consulta.get("dataFinal", pd.Timestamp.today().strftime("%d/%m/%Y")), format = "%d/%m/%Y"),
+      pd.Timestamp.today().normalize() + pd.DateOffset(years = 2 if freq == "Anual" else 0)
+      )
+  datas = datas_sinteticas(freq, inicio, fim)
+  linhas = [f'"{d:%d/%m/%Y}";"{str(v).replace(".", ",")}"' for d, v in zip(datas, valor_sintetico(codigo, datas))]
+  return "text/csv", "\n".join(['"data";"valor"'] + linhas).encode("utf-8")
+
+# BCB/ODATA: CSV das expectativas Focus, com $filter (Data ge), $select e $top/$skip
+def gerar_odata(caminho, consulta):
+  recurso = caminho.rstrip("/").split("/")[-1]
+  filtro = consulta.get("$filter", "")
+  inicio = re.search(r"Data ge '(\d{4}-\d{2}-\d{2})'", filtro)
+  datas = pd.date_range(inicio.group(1) if inicio else "2001-11-01", pd.Timestamp.today(), freq = "W-FRI")
+
+  # Os valores não dependem do filtro de data, como na API original
+  semente = re.sub(r" and Data ge '[^']*'", "", filtro)
+  linhas = []
+  for data, valor in zip(datas, valor_sintetico(recurso + semente, datas)):
+    if "Inflacao12Meses" in recurso:
+      referencias = [None]
+    elif "Anuais" in recurso:
+      referencias = [f"{data.year + i}" for i in range(0, 4)]
+    elif "Trimestrais" in recurso:
+      referencias = [f"{p.quarter}/{p.year}" for p in pd.period_range(data, periods = 12, freq = "Q")]
+    else:
+      referencias = [p.strftime("%m/%Y") for p in pd.period_range(data, periods = 18, freq = "M")]
+    for i, referencia in enumerate(referencias):
+      linhas.append({
+          "Indicador": re.search(r"Indicador eq '([^']*)'", filtro).group(1) if "Indicador eq" in filtro else "",
+          "Data": f"{data:%Y-%m-%d}",
+          "DataReferencia": referencia,
+          "Media": valor + i / 100,
+          "Mediana": valor + i / 100,
+          "numeroRespondentes": 100
+      })
+
+  df = pd.DataFrame(linhas)
+  if "Inflacao12Meses" in recurso:
+    df = df.drop(columns = "DataReferencia")
+  if consulta.get("$select"):
+    df = df.filter(consulta["$select"].split(","))
+  inicio_pagina = int(consulta.get("$skip", 0))
+  df = df.iloc[inicio_pagina:inicio_pagina + int(consulta.get("$top", len(df) or 1))]
+  for col in ["Media", "Mediana"]:
+    if col in df.columns:
+      df[col] = df[col].round(2).astype(str).str.replace(".", ",")
+  return "text/csv", df.to_csv(index = False, quoting = 2 if not df.empty else 0).encode("utf-8")
+
+# IPEADATA: JSON no formato OData v4 com VALDATA/VALVALOR
+def gerar_ipeadata(caminho, consulta):
+  codigo = re.search(r"SERCODIGO='([^']*)'", caminho).group(1)
+  datas = datas_sinteticas(frequencias_sinteticas.get(codigo, "Mensal"))
+  valores = [
+      {"SERCODIGO": codigo, "VALDATA": f"{d:%Y-%m-%d}T00:00:00-03:00", "VALVALOR": v, "NIVNOME": "", "TERCODIGO": ""}
+      for d, v in zip(datas, valor_sintetico(codigo, datas))
+      ]
+  return "application/json", json.dumps({"value": valores}).encode("utf-8")
+
+# IBGE/SIDRA: JSON com linha de cabeçalho e período no código D3C (AAAAMM ou AAAA0T)
+def gerar_sidra(caminho, consulta):
+  codigo = "https://apisidra.ibge.gov.br" + caminho
+  freq = frequencias_sinteticas.get(codigo, "Mensal")
+  datas = datas_sinteticas(freq)
+  periodos = [f"{d.year}{d.month:02d}" if freq == "Mensal" else f"{d.year}0{d.quarter}" for d in datas]
+  valores = [{"D3C": "Mês (Código)" if freq == "Mensal" else "Trimestre (Código)", "V": "Valor"}]
+  valores += [{"D3C": p, "V": str(v)} for p, v in zip(periodos, valor_sintetico(codigo, datas))]
+  return "application/json", json.dumps(valores, ensure_ascii = False).encode("utf-8")
+
+# FRED: CSV observation_date,<código> com "." para valores ausentes
+def gerar_fred(caminho, consulta):
+  codigo = consulta["id"]
+  datas = datas_sinteticas(frequencias_sinteticas.get(codigo, "Mensal"))
+  linhas = [f"{d:%Y-%m-%d},{v}" for d, v in zip(datas, valor_sintetico(codigo, datas))]
+  return "text/csv", "\n".join([f"observation_date,{codigo}"] + linhas).encode("utf-8")
+
+# IFI: planilha com a aba "Hiato do Produto" (2 linhas antes do cabeçalho)
+def gerar_ifi(caminho, consulta):
+  datas = datas_sinteticas("Trimestral", "1996-01-01")
+  valores = [(v - 12) / 100 for v in valor_sintetico("hiato", datas)]
+  df = pd.DataFrame({
+      "Data": datas,
+      "Limite inferior": [v - 0.01 for v in valores],
+      "Hiato": valores,
+      "Limite superior": [v + 0.01 for v in valores]
+      })
+  return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", para_xlsx(df, "Hiato do Produto", ["Estimativas do hiato do produto (IFI)", "Dados sintéticos"])
+
+# Google Sheets: planilha de metadados
+def gerar_metadados(caminho, consulta):
+  return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", para_xlsx(metadados_sinteticos, "Metadados")
+
+# Geradores sintéticos por servidor/caminho
+geradores = [
+    (r"^api\.bcb\.gov\.br/dados/serie/bcdata\.sgs\.", gerar_sgs),
+    (r"^olinda\.bcb\.gov\.br/", gerar_odata),
+    (r"ipeadata\.gov\.br/api/", gerar_ipeadata),
+    (r"^apisidra\.ibge\.gov\.br/", gerar_sidra),
+    (r"^fred\.stlouisfed\.org/", gerar_fred),
+    (r"^docs\.google\.com/spreadsheets/", gerar_metadados),
+    (r"senado\.leg\.br/ifi/", gerar_ifi)
+]
+
+
+# Parâmetros de período e de paginação das consultas
+parametros_periodo = ["dataInicial", "dataFinal"]
+parametros_pagina = ["$skip", "$top"]
+
+# Separa as condições do $filter do ODATA em filtros de data e demais filtros
+def separar_filtro(filtro):
+  condicoes = [c.strip() for c in re.split(r"\s+and\s+", filtro) if c.strip()]
+  datas = [c for c in condicoes if re.match(r"^Data\s+(ge|gt|le|lt|eq)\s+'", c)]
+  return datas, [c for c in condicoes if c not in datas]
+
+# Consulta de uma URL sem período e paginação (identifica gravações que podem
+# ser recortadas para atender a URL)
+def consulta_sem_periodo(partes):
+  parametros = []
+  for chave, valor in parse_qsl(partes.query, keep_blank_values = True):
+    if chave in parametros_periodo + parametros_pagina:
+      continue
+    if chave == "$filter":
+      valor = " and ".join(separar_filtro(valor)[1])
+    parametros.append((chave, valor))
+  return repr(sorted(parametros))
+
+# Caminhos da gravação de uma URL: exata (URL completa) e índice das gravações
+# da mesma consulta com outro período ou página
+def caminhos_fixture(url):
+  partes = urlsplit(url)
+  pasta = os.path.join(pasta_fixtures, partes.netloc)
+  exato = hashlib.sha256(url.encode()).hexdigest()[:32]
+  consulta = hashlib.sha256(f"{partes.netloc}{partes.path}{consulta_sem_periodo(partes)}".encode()).hexdigest()[:32]
+  return os.path.join(pasta, exato), os.path.join(pasta, f"consulta-{consulta}.json")
+
+# Lê uma gravação (conteúdo + tipo), se existir
+def ler_fixture(base):
+  if not os.path.exists(f"{base}.json"):
+    return None
+  with open(f"{base}.json", encoding = "utf-8") as arquivo:
+    info = json.load(arquivo)
+  with open(f"{base}.bin", "rb") as arquivo:
+    return info["tipo"], arquivo.read()
+
+# Grava a resposta de uma URL e a registra no índice da sua consulta
+def gravar_fixture(url, tipo, conteudo):
+  exato, indice = caminhos_fixture(url)
+  os.makedirs(os.path.dirname(exato), exist_ok = True)
+  with open(f"{exato}.bin", "wb") as arquivo:
+    arquivo.write(conteudo)
+  with open(f"{exato}.json", "w", encoding = "utf-8") as arquivo:
+    json.dump({"url": url, "tipo": tipo, "gravado_em": f"{pd.Timestamp.today():%Y-%m-%d}"}, arquivo, ensure_ascii = False)
+  urls = ler_indice_fixture(indice)
+  if url not in urls:
+    with open(indice, "w", encoding = "utf-8") as arquivo:
+      json.dump(urls + [url], arquivo, ensure_ascii = False)
+
+# URLs gravadas de uma consulta (lista vazia se nenhuma)
+def ler_indice_fixture(indice):
+  if not os.path.exists(indice):
+    return []
+  with open(indice, encoding = "utf-8") as arquivo:
+    return json.load(arquivo)
+
+# Data inicial do filtro "Data ge" do ODATA (None se ausente)
+def inicio_odata(consulta):
+  datas = separar_filtro(consulta.get("$filter", ""))[0]
+  inicio = [re.search(r"'([^']*)'", c).group(1) for c in datas if c.startswith("Data ge")]
+  return pd.Timestamp(inicio[0]) if inicio else None
+
+# Recorta a gravação de outra URL da mesma consulta para atender a URL pedida,
+# se ela cobrir o período (e, no ODATA, estiver completa a partir do seu
+# início); retorna None se não cobrir
+def recortar_fixture(url, url_gravada, gravado_em, tipo, conteudo):
+  pedida = dict(parse_qsl(urlsplit(url).query, keep_blank_values = True))
+  gravada = dict(parse_qsl(urlsplit(url_gravada).query, keep_blank_values = True))
+
+  # BCB/SGS: a gravação precisa conter o período pedido (ou ir até a data
+  # em que foi gravada)
+  if "dataInicial" in pedida:
+    inicio, fim = [pd.to_datetime(pedida.get(p), dayfirst = True) for p in parametros_periodo]
+    inicio_gravado, fim_gravado = [pd.to_datetime(gravada.get(p), dayfirst = True) for p in parametros_periodo]
+    if inicio_gravado > inicio or fim_gravado < min(fim, pd.Timestamp(gravado_em)):
+      return None
+    df = pd.read_csv(BytesIO(conteudo), sep = ";", dtype = str)
+    datas = pd.to_datetime(df["data"], dayfirst = True)
+    df = df[(datas >= inicio) & (datas <= fim)]
+    return tipo, df.to_csv(sep = ";", index = False, quoting = csv.QUOTE_ALL).encode("utf-8")
+
+  # BCB/ODATA: a gravação precisa ser a primeira e última página da consulta
+  # a partir de uma data igual ou anterior à pedida
+  if "$skip" in pedida or "$top" in pedida or inicio_odata(pedida) is not None:
+    df = pd.read_csv(BytesIO(conteudo), dtype = str)
+    inicio, inicio_gravado = inicio_odata(pedida), inicio_odata(gravada)
+    completa = int(gravada.get("$skip", 0)) == 0 and ("$top" not in gravada or df.shape[0] < int(gravada["$top"]))
+    if not completa or (inicio_gravado is not None and (inicio is None or inicio_gravado > inicio)):
+      return None
+    if inicio is not None:
+      df = df[pd.to_datetime(df["Data"]) >= inicio]
+    inicio_pagina = int(pedida.get("$skip", 0))
+    df = df.iloc[inicio_pagina:inicio_pagina + int(pedida.get("$top", len(df) or 1))]
+    return tipo, df.to_csv(index = False, quoting = csv.QUOTE_NONNUMERIC if not df.empty else csv.QUOTE_MINIMAL).encode("utf-8")
+
+  return tipo, conteudo
+
+# Resolve a resposta de uma URL original: gravação exata, gravação da mesma
+# consulta recortada, API original (modo de gravação) ou dados sintéticos
+def resolver(url, gravar):
+  exato, indice = caminhos_fixture(url)
+  resposta = ler_fixture(exato)
+  if resposta is not None:
+    return resposta
+
+  if gravar:
+    original = requests.get(url, timeout = (10, 120))
+    original.raise_for_status()
+    tipo = original.headers.get("Content-Type", "application/octet-stream")
+    gravar_fixture(url, tipo, original.content)
+    return tipo, original.content
+
+  gravadas = ler_indice_fixture(indice)
+  for url_gravada in gravadas:
+    base = caminhos_fixture(url_gravada)[0]
+    with open(f"{base}.json", encoding = "utf-8") as arquivo:
+      gravado_em = json.load(arquivo).get("gravado_em", pd.Timestamp.today())
+    resposta = recortar_fixture(url, url_gravada, gravado_em, *ler_fixture(base))
+    if resposta is not None:
+      return resposta
+  if gravadas:
+    return None
+
+  partes = urlsplit(url)
+  for padrao, gerador in geradores:
+    if re.search(padrao, f"{partes.netloc}{partes.path}"):
+      return gerador(partes.path, dict(parse_qsl(partes.query, keep_blank_values = True)))
+  return None
+
+
+# Atende as requisições com latência, falhas e limite de banda configuráveis
+class Replay(BaseHTTPRequestHandler):
+
+  protocol_version = "HTTP/1.1"
+  configuracao = None
+  sorteio = random.Random(1984)
+  trava_sorteio = threading.Lock()
+
+  def do_GET(self):
+    conf = self.configuracao
+    esquema, resto = self.path.lstrip("/").split("/", 1)
+    url = f"{esquema}://{resto}"
+
+    time.sleep(conf.latencia)
+    with self.trava_sorteio:
+      falhar = self.sorteio.random() < conf.taxa_erro
+    if falhar:
+      return self.responder(503, "text/plain", b"Falha simulada")
+
+    try:
+      resposta = resolver(url, conf.gravar)
+    except Exception as erro:
+      return self.responder(502, "text/plain", str(erro).encode("utf-8"))
+    if resposta is None:
+      return self.responder(404, "text/plain", "URL sem gravação nem gerador".encode("utf-8"))
+
+    tipo, conteudo = resposta
+    etag = '"' + hashlib.sha256(conteudo).hexdigest()[:32] + '"'
+    if self.headers.get("If-None-Match") == etag:
+      return self.responder(304, tipo, b"", etag)
+    self.responder(200, tipo, conteudo, etag)
+
+  def responder(self, status, tipo, conteudo, etag = None):
+    self.send_response(status)
+    self.send_header("Content-Type", tipo)
+    self.send_header("Content-Length", str(len(conteudo)))
+    if etag is not None:
+      self.send_header("ETag", etag)
+    self.end_headers()
+    banda = self.configuracao.banda
+    for inicio in range(0, len(conteudo), tamanho_bloco):
+      bloco = conteudo[inicio:inicio + tamanho_bloco]
+      self.wfile.write(bloco)
+      if banda:
+        time.sleep(len(bloco) / banda)
+
+  def log_message(self, formato, *args):
+    if not self.configuracao.silencioso:
+      super().log_message(formato, *args)
+
+
+if __name__ == "__main__":
+  argumentos = argparse.ArgumentParser(description = "Servidor local que substitui as APIs de coleta de dados")
+  argumentos.add_argument("--porta", type = int, default = 8765)
+  argumentos.add_argument("--latencia", type = float, default = 0, help = "segundos de espera por requisição")
+  argumentos.add_argument("--taxa-erro", type = float, default = 0, help = "proporção de respostas 503 simuladas")
+  argumentos.add_argument("--banda", type = float, default = 0, help = "limite de bytes por segundo por resposta (0 = sem limite)")
+  argumentos.add_argument("--gravar", action = "store_true", help = "busca na API original e grava URLs sem gravação")
+  argumentos.add_argument("--silencioso", action = "store_true")
+  Replay.configuracao = argumentos.parse_args()
+
+  servidor = ThreadingHTTPServer(("127.0.0.1", Replay.configuracao.porta), Replay)
+  print(f"Servidor local em http://127.0.0.1:{Replay.configuracao.porta} (fixtures em {pasta_fixtures}/)")
+  servidor.serve_forever()